@@ -0,0 +1,134 @@
+# ai_services/ann_index.py
+from logging import getLogger
+
+import numpy as np
+
+from .index_storage import derived_path, load_derived, save_derived
+from .utils.vector_math import normalize_rows, top_k_indices
+
+logger = getLogger(__name__)
+
+
+class IVFIndex:
+    """IVF-flat approximate index: rows are bucketed under their nearest k-means centroid.
+
+    A query scores every centroid, then scans only the rows of the `nprobe` closest
+    buckets. Raising `nprobe` trades latency for recall.
+    """
+
+    def __init__(self, n_lists=None, nprobe=8, n_iter=20, max_training_rows=100_000, seed=0):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.max_training_rows = max_training_rows
+        self.seed = seed
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.trained_size = 0
+        self._list_ids = np.empty(0, dtype=np.int64)
+        self._list_offsets = np.zeros(1, dtype=np.int64)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self.assignments)
+
+    def build(self, embeddings: np.ndarray):
+        """Train centroids on (a sample of) the unit-length rows and bucket every row."""
+        n_rows = len(embeddings)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_rows)))
+        n_lists = min(n_lists, n_rows)
+        rng = np.random.default_rng(self.seed)
+
+        if n_rows > self.max_training_rows:
+            sample = np.sort(rng.choice(n_rows, self.max_training_rows, replace=False))
+            training = np.asarray(embeddings[sample], dtype=np.float32)
+        else:
+            training = np.asarray(embeddings, dtype=np.float32)
+
+        n_lists = min(n_lists, len(training))
+        logger.info(f"Training IVF index with {n_lists} lists on {len(training)} rows.")
+        self.centroids = _spherical_kmeans(training, n_lists, self.n_iter, rng)
+        self.assignments = _assign(embeddings, self.centroids)
+        self.trained_size = n_rows
+        self._rebuild_lists()
+
+    def extended(self, new_embeddings: np.ndarray) -> 'IVFIndex':
+        """Return a copy with newly appended rows bucketed under the existing centroids."""
+        if not self.is_trained:
+            raise ValueError("IVF index must be built before rows can be added.")
+        index = IVFIndex(self.n_lists, self.nprobe, self.n_iter, self.max_training_rows, self.seed)
+        index.centroids = self.centroids
+        index.assignments = np.concatenate([self.assignments, _assign(new_embeddings, self.centroids)])
+        index.trained_size = self.trained_size
+        index._rebuild_lists()
+        return index
+
+    def search(self, embeddings: np.ndarray, query: np.ndarray, top_k: int, nprobe=None, deleted=None):
+        """Return (row indices, similarities) of the best rows in the probed buckets.
+
+        Rows flagged in the boolean mask `deleted` are skipped.
+        """
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probed = top_k_indices(self.centroids @ query, nprobe)
+        candidates = np.concatenate([
+            self._list_ids[self._list_offsets[i]:self._list_offsets[i + 1]] for i in probed
+        ])
+        if deleted is not None:
+            candidates = candidates[~deleted[candidates]]
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        # Gather in row order so memory-mapped reads stay sequential.
+        candidates.sort()
+        scores = embeddings[candidates] @ query
+        best = top_k_indices(scores, top_k)
+        return candidates[best], scores[best]
+
+    def _rebuild_lists(self):
+        order = np.argsort(self.assignments, kind='stable')
+        counts = np.bincount(self.assignments, minlength=len(self.centroids))
+        self._list_ids = order.astype(np.int64)
+        self._list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def save(self, index_dir: str, rows_id: str):
+        """Persist next to the index, keyed on the rows it was built from."""
+        save_derived(derived_path(index_dir, 'ivf', rows_id, len(self)),
+                     {'centroids': self.centroids, 'assignments': self.assignments})
+
+    def load(self, index_dir: str, rows_id: str, n_rows: int) -> bool:
+        """Load the centroids and assignments persisted for exactly these rows, if there are any."""
+        arrays = load_derived(derived_path(index_dir, 'ivf', rows_id, n_rows), ('centroids', 'assignments'))
+        if arrays is None or len(arrays['assignments']) != n_rows:
+            return False
+        self.centroids = arrays['centroids']
+        self.assignments = arrays['assignments'].astype(np.int32)
+        self.trained_size = n_rows
+        self._rebuild_lists()
+        return True
+
+
+def _assign(embeddings: np.ndarray, centroids: np.ndarray, block_size=65_536) -> np.ndarray:
+    """Nearest centroid for every row, computed in blocks to bound memory."""
+    assignments = np.empty(len(embeddings), dtype=np.int32)
+    for start in range(0, len(embeddings), block_size):
+        block = np.asarray(embeddings[start:start + block_size], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def _spherical_kmeans(data: np.ndarray, n_lists: int, n_iter: int, rng) -> np.ndarray:
+    """K-means on unit vectors, using dot products as the similarity."""
+    centroids = data[rng.choice(len(data), n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _assign(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        counts = np.bincount(assignments, minlength=n_lists)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed dead lists with random rows instead of leaving them empty.
+            sums[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
@@ -0,0 +1,79 @@
+# ai_services/bm25.py
+from logging import getLogger
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+from .utils.vector_math import top_k_indices
+
+logger = getLogger(__name__)
+
+# Keeps dotted and symbol-suffixed tool names ("asp.net", "node.js", "c++", "c#") as single terms.
+TOKEN_PATTERN = r"(?u)\w(?:[\w\-]|\.(?=\w))*[+#]*"
+
+
+class BM25Index:
+    """Okapi BM25 over chunk texts, stored as a sparse document-term weight matrix.
+
+    Scoring a batch of queries is one sparse matrix product, with no per-document Python loop.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.vectorizer = None
+        self.weights = None
+
+    def __len__(self):
+        return 0 if self.weights is None else self.weights.shape[0]
+
+    def build(self, texts):
+        self.vectorizer = CountVectorizer(token_pattern=TOKEN_PATTERN, lowercase=True, dtype=np.float32)
+        try:
+            counts = self.vectorizer.fit_transform(texts).tocsr()
+        except ValueError:
+            # Empty vocabulary: nothing to match against.
+            self.vectorizer, self.weights = None, None
+            return
+        n_docs = counts.shape[0]
+        doc_lengths = np.asarray(counts.sum(axis=1)).ravel()
+        avg_length = doc_lengths.mean() if n_docs else 0.0
+        doc_freq = np.bincount(counts.indices, minlength=counts.shape[1])
+        idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+
+        # Saturate each term frequency in place, using its row's length normalization.
+        row_norm = self.k1 * (1 - self.b + self.b * doc_lengths / max(avg_length, 1e-9))
+        tf = counts.data
+        norms = np.repeat(row_norm, np.diff(counts.indptr)).astype(np.float32)
+        counts.data = tf * (self.k1 + 1) / (tf + norms) * idf[counts.indices]
+        self.weights = counts
+        logger.info(f"Built BM25 index over {n_docs} chunks with {len(idf)} terms.")
+
+    def scores(self, queries: list[str]) -> np.ndarray:
+        """BM25 score of every chunk for each query, shape (n_chunks, n_queries)."""
+        if self.weights is None:
+            return np.zeros((0, len(queries)), dtype=np.float32)
+        query_terms = self.vectorizer.transform(queries).T.tocsr()
+        return np.asarray((self.weights @ query_terms).toarray(), dtype=np.float32)
+
+
+def ranked_rows(scores: np.ndarray, top_k: int, rows=None) -> np.ndarray:
+    """Rows with a positive score, best first, optionally restricted to `rows`."""
+    if rows is not None:
+        subset = scores[rows]
+        best = top_k_indices(subset, top_k)
+        return rows[best[subset[best] > 0]]
+    best = top_k_indices(scores, top_k)
+    return best[scores[best] > 0]
+
+
+def reciprocal_rank_fusion(rankings: list[np.ndarray], k=60) -> np.ndarray:
+    """Fuse ranked row lists by summing 1 / (k + rank); returns rows, best first."""
+    rankings = [np.asarray(ranking, dtype=np.int64) for ranking in rankings if len(ranking)]
+    if not rankings:
+        return np.empty(0, dtype=np.int64)
+    rows = np.concatenate(rankings)
+    contributions = np.concatenate([1.0 / (k + np.arange(1, len(ranking) + 1)) for ranking in rankings])
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    fused = np.bincount(inverse, weights=contributions)
+    return unique_rows[np.argsort(-fused, kind='stable')]
@@ -0,0 +1,105 @@
+# ai_services/dedup.py
+import re
+import zlib
+from collections import defaultdict
+from logging import getLogger
+
+import numpy as np
+
+logger = getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+
+
+class MinHashDeduplicator:
+    """Near-duplicate detection over word shingles with MinHash signatures and LSH banding.
+
+    Texts whose estimated Jaccard similarity is at least `threshold` end up in the same
+    cluster. LSH only proposes candidate pairs that share a band, so the cost grows with
+    the number of texts rather than the number of pairs.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, bands=32, shingle_size=3, seed=0):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands}).")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: (a * x + b) >> 32, with wrap-around in uint64.
+        self._a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+
+    def _shingles(self, text: str) -> np.ndarray:
+        words = _WORD.findall(text.lower())
+        n = self.shingle_size
+        grams = {' '.join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        return np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint64, count=len(grams))
+
+    def signatures(self, texts) -> np.ndarray:
+        """One row of `num_perm` minimum hash values per text."""
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            for i, text in enumerate(texts):
+                hashes = self._shingles(text)
+                signatures[i] = ((hashes[:, None] * self._a + self._b) >> np.uint64(32)).min(axis=0)
+        return signatures
+
+    def clusters(self, texts) -> np.ndarray:
+        """Label each text with the index of the first text of its near-duplicate cluster."""
+        n = len(texts)
+        parent = np.arange(n)
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        signatures = self.signatures(texts)
+        rows = self.num_perm // self.bands
+        checked = set()
+        for band in range(self.bands):
+            buckets = defaultdict(list)
+            for i, key in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+                buckets[key.tobytes()].append(i)
+            for members in buckets.values():
+                first = members[0]
+                for other in members[1:]:
+                    if (first, other) in checked:
+                        continue
+                    checked.add((first, other))
+                    if np.mean(signatures[first] == signatures[other]) >= self.threshold:
+                        root_a, root_b = find(first), find(other)
+                        # The earlier text stays canonical, so re-ingesting keeps the same rows.
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        return np.array([find(i) for i in range(n)], dtype=np.int64)
+
+
+def merge_duplicate_columns(columns: dict, labels: np.ndarray) -> tuple[np.ndarray, dict]:
+    """Keep one row per cluster and fold the other rows' metadata into it.
+
+    Returns the kept row ids and their columns. A column whose values differ within a
+    cluster becomes the list of distinct values, so a canonical chunk still records every
+    roadmap (or chunk id) it came from. `duplicates` counts the rows each one stands for.
+    """
+    keep = np.flatnonzero(labels == np.arange(len(labels)))
+    members = defaultdict(list)
+    for row, label in enumerate(labels):
+        members[label].append(row)
+
+    merged = {}
+    for name, values in columns.items():
+        column = []
+        for canonical in keep:
+            distinct = list(dict.fromkeys(
+                item for row in members[canonical]
+                for item in (values[row] if isinstance(values[row], list) else [values[row]])
+                if item is not None
+            ))
+            column.append(distinct[0] if len(distinct) == 1 else (distinct or None))
+        merged[name] = column
+    merged['duplicates'] = [len(members[canonical]) for canonical in keep]
+    return keep, merged
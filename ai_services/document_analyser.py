@@ -1,4 +1,5 @@
 # document_analyzer.py
+import asyncio
 import json
 import re
 from typing import Dict, List, Optional, Any
@@ -7,6 +8,7 @@ from sqlalchemy.orm import Session
 
 from ai_services.llm_client import LLMClient
 from ai_services.indexer import index_chunks, search_chunks, remove_document
+from ai_services.namespaces import namespaced_store
 from ai_services.utils.prompts import PromptTemplates
 from ai_services.utils.input_validator import InputValidator
 from models import File as FileModel, User as UserModel
@@ -29,9 +31,13 @@ class DocumentAnalyzer:
             self.validator = None
 
     def add_document(
-        self, db: Session, user_id: str, filename: str, content_type: str, text_content: str
+        self, db: Session, user_id: str, filename: str, content_type: str, text_content: str,
+        background_tasks: Optional[Any] = None
     ) -> FileModel:
-        """Analyzes, persists, and indexes a document for a given user."""
+        """Analyzes, persists, and indexes a document for a given user.
+
+        With `background_tasks`, the chunks are embedded after the response is sent instead of inline.
+        """
         # 1. Validate input
         if not all([self.validator, self.llm_client, self.prompt_templates]):
             raise ConnectionError("DocumentAnalyzer is not properly initialized.")
@@ -70,11 +76,22 @@ class DocumentAnalyzer:
         # 4. Index the document chunks for semantic search
         if chunks:
             # Use the newly created file's ID for indexing
-            index_chunks(str(new_file.id), chunks)
+            index_chunks(chunks, str(new_file.id))
+            if background_tasks is not None:
+                background_tasks.add_task(self._index_embeddings, user_id, new_file.id, chunks)
+            else:
+                self._index_embeddings(user_id, new_file.id, chunks)
 
         print(f"✅ Document '{filename}' analyzed and stored with ID: {new_file.id}")
         return new_file
 
+    def _index_embeddings(self, user_id: str, document_id, chunks: List[str]):
+        """Adds the chunks to the user's vector index; the keyword index above stays the fallback."""
+        try:
+            namespaced_store.add_document(user_id, document_id, chunks)
+        except Exception as e:
+            print(f"⚠️ Could not embed document {document_id}, searching it by keywords only: {e}")
+
     def get_document(self, db: Session, user_id: str, document_id: str) -> Optional[FileModel]:
         """Retrieves a single document for a user from the database."""
         return db.query(FileModel).filter(
@@ -93,6 +110,7 @@ class DocumentAnalyzer:
             db.delete(doc_to_delete)
             db.commit()
             remove_document(str(document_id))  # Remove from search index
+            namespaced_store.remove_document(user_id, document_id)
             print(f"🗑️ Document with ID {document_id} deleted.")
             return True
         return False
@@ -109,19 +127,48 @@ class DocumentAnalyzer:
 
         # 2. Find relevant context from the indexed chunks
         sanitized_query = self.validator.sanitize_text(query)
-        search_results = search_chunks(sanitized_query, document_id=str(document.id))
+        # Semantic search over the user's own namespace, keyword search as a fallback
+        search_results = namespaced_store.query(user_id, sanitized_query, top_k=5, document_id=document.id)
+        context = self._chat_context(document, sanitized_query, search_results)
+
+        # 3. Build prompt and get LLM response
+        prompt = self._chat_prompt(context, sanitized_query)
+        response = self.llm_client.generate_content(prompt)
+        return self._chat_result(document_id, prompt, context, response)
+
+    async def achat_with_document(self, db: Session, user_id: str, document_id: str, query: str) -> Dict:
+        """Async variant for route handlers: retrieval and the LLM call run off the event loop."""
+        if not self.llm_client or not self.prompt_templates or not self.validator:
+            raise ConnectionError("DocumentAnalyzer is not properly initialized.")
+
+        document = self.get_document(db, user_id, document_id)
+        if not document:
+            raise ValueError("Document not found or access denied.")
+
+        sanitized_query = self.validator.sanitize_text(query)
+        search_results = await namespaced_store.aquery(user_id, sanitized_query, top_k=5, document_id=document.id)
+        context = self._chat_context(document, sanitized_query, search_results)
+
+        prompt = self._chat_prompt(context, sanitized_query)
+        response = await asyncio.to_thread(self.llm_client.generate_content, prompt)
+        return self._chat_result(document_id, prompt, context, response)
+
+    def _chat_context(self, document: FileModel, sanitized_query: str, search_results: List[Dict]) -> str:
+        if not search_results:
+            search_results = search_chunks(sanitized_query, document_id=str(document.id))
         context = "\n".join([res['content'] for res in search_results])
         if not context:
             context = document.summary  # Fallback to summary if no relevant chunks are found
+        return context
 
-        # 3. Build prompt and get LLM response
-        prompt = self.prompt_templates.get_chat_prompt(
+    def _chat_prompt(self, context: str, sanitized_query: str) -> str:
+        return self.prompt_templates.get_chat_prompt(
             doc_content=context,
             user_query=sanitized_query,
             chat_history=[] # Placeholder for future chat history implementation
         )
-        response = self.llm_client.generate_content(prompt)
 
+    def _chat_result(self, document_id: str, prompt: str, context: str, response) -> Dict:
         if not response or not response.text:
             raise ConnectionError("Failed to get a valid response from the LLM.")
 
@@ -0,0 +1,53 @@
+# ai_services/embedding_cache.py
+import os
+import hashlib
+import sqlite3
+import threading
+from logging import getLogger
+
+import numpy as np
+
+logger = getLogger(__name__)
+
+
+class EmbeddingCache:
+    """Persistent content-addressed cache: hash(model name, chunk text) -> unit-length embedding."""
+
+    def __init__(self, path: str, model_name: str, batch_size=500):
+        self.path = path
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).digest()
+
+    def get_many(self, texts: list[str]) -> list:
+        """Cached embedding for each text, or None where it has not been encoded yet."""
+        keys = [self.key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), self.batch_size):
+                batch = keys[start:start + self.batch_size]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+                found.update(rows)
+        return [np.frombuffer(found[key], dtype=np.float32) if key in found else None for key in keys]
+
+    def put_many(self, texts: list[str], embeddings: np.ndarray):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        rows = [(self.key(text), embedding.tobytes()) for text, embedding in zip(texts, embeddings)]
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write {len(rows)} embeddings to cache {self.path}: {e}")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
@@ -0,0 +1,285 @@
+# ai_services/embedding_server.py
+"""Out-of-process embedding and search server, and the client that talks to it.
+
+One server process owns the encoder and the index. The uvicorn workers use
+RemoteVectorStore, which has the VectorStore API, over a Unix domain socket, so the
+model is loaded once per host instead of once per worker.
+
+    python -m ai_services.embedding_server --socket /tmp/ncs-vectors.sock
+
+Workers switch to the client when VECTOR_STORE_SOCKET points at that socket.
+
+Wire format: each message is a 9-byte header (opcode: uint8, JSON length: uint32,
+blob length: uint32, big-endian), a UTF-8 JSON body and a binary blob. Embeddings
+travel in the blob as raw little-endian float32 rows, with their shape in the JSON.
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import uuid
+from logging import getLogger
+
+import numpy as np
+
+from .utils.bounded_executor import BoundedExecutor
+from .utils.text_chunker import batched, iter_chunks
+
+logger = getLogger(__name__)
+
+HEADER = struct.Struct('!BII')
+
+OP_OK = 0
+OP_ENCODE_CHUNKS = 1
+OP_ENCODE_QUERIES = 2
+OP_QUERY = 3
+OP_ADD = 4
+OP_STATUS = 5
+OP_WAIT_ENCODER = 6
+OP_RELOAD = 7
+OP_DELETE = 8
+OP_ERROR = 255
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+    data = bytearray()
+    while len(data) < n:
+        part = sock.recv(n - len(data))
+        if not part:
+            raise ConnectionError("Embedding server connection closed.")
+        data += part
+    return bytes(data)
+
+
+def send_message(sock: socket.socket, opcode: int, body=None, array=None):
+    """Send one frame; `array` (if any) is sent as float32 rows and its shape added to the body."""
+    body = dict(body or {})
+    blob = b''
+    if array is not None:
+        array = np.ascontiguousarray(array, dtype='<f4')
+        body['shape'] = list(array.shape)
+        blob = array.tobytes()
+    payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+    sock.sendall(HEADER.pack(opcode, len(payload), len(blob)) + payload + blob)
+
+
+def _jsonable(value):
+    """Filters and metadata as JSON: sets and tuples become lists and UUIDs strings, as the store
+    itself would treat them. Any other non-JSON value still fails to send."""
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_jsonable(item) for item in value]
+    return str(value) if isinstance(value, uuid.UUID) else value
+
+
+def recv_message(sock: socket.socket) -> tuple[int, dict, np.ndarray]:
+    """Receive one frame as (opcode, body, array or None)."""
+    opcode, payload_length, blob_length = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    body = json.loads(_recv_exactly(sock, payload_length).decode('utf-8')) if payload_length else {}
+    array = None
+    if 'shape' in body:
+        array = np.frombuffer(_recv_exactly(sock, blob_length), dtype='<f4').reshape(body.pop('shape'))
+    return opcode, body, array
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Serves one worker connection until it closes."""
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            try:
+                opcode, body, _ = recv_message(self.request)
+            except ConnectionError:
+                return
+            try:
+                reply, array = self._dispatch(store, opcode, body)
+                send_message(self.request, OP_OK, reply, array)
+            except Exception as e:
+                send_message(self.request, OP_ERROR, {'error': str(e), 'type': type(e).__name__})
+
+    @staticmethod
+    def _dispatch(store, opcode: int, body: dict):
+        if opcode == OP_ENCODE_CHUNKS:
+            return {}, store.encode_chunks(body['texts'])
+        if opcode == OP_ENCODE_QUERIES:
+            return {}, store.encode_queries(body['texts'])
+        if opcode == OP_QUERY:
+            results = store.query_chunks_batch(body['queries'], body['top_k'], body.get('min_similarity'),
+                                               body.get('filter'), body.get('hybrid'))
+            return {'results': results}, None
+        if opcode == OP_ADD:
+            store.add_chunks(body['chunks'], body.get('metadata'))
+            return {}, None
+        if opcode == OP_STATUS:
+            return {**store.index_stats(), 'encoder': store.encoder_stats(), 'caches': store.cache_stats()}, None
+        if opcode == OP_WAIT_ENCODER:
+            return {'ready': store.wait_for_encoder(body.get('timeout'))}, None
+        if opcode == OP_RELOAD:
+            return {'generation': store.request_reload()}, None
+        if opcode == OP_DELETE:
+            return {'deleted': store.delete_chunks(body['filter'])}, None
+        raise ValueError(f"Unknown opcode {opcode}.")
+
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, store):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.store = store
+        super().__init__(socket_path, _Handler)
+        # Only processes running as the same user (or group) may connect.
+        os.chmod(socket_path, 0o660)
+
+
+class RemoteVectorStore:
+    """Client with the VectorStore API, backed by an EmbeddingServer.
+
+    Each thread keeps one connection and reconnects once if the server restarted.
+    Async methods run the blocking socket calls on a local bounded executor.
+    `encoder_backend` names the server's backend, as VectorStore.encoder_backend does.
+    """
+
+    def __init__(self, socket_path: str, timeout=30.0, executor_workers=8, executor_queue_size=64,
+                 encoder_backend='sentence-transformers'):
+        self.socket_path = socket_path
+        self.encoder_backend = encoder_backend
+        self.timeout = timeout
+        self.executor = BoundedExecutor(executor_workers, executor_queue_size, name='vector-client')
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self._local.sock = sock
+        return sock
+
+    def _request(self, opcode: int, body=None):
+        sock = getattr(self._local, 'sock', None)
+        try:
+            try:
+                if sock is None:
+                    sock = self._connect()
+                send_message(sock, opcode, body)
+            except OSError:
+                if getattr(self._local, 'sock', None) is None:
+                    raise
+                # A kept-alive connection may have gone stale across a server restart. Nothing was
+                # processed yet, so reconnecting and resending once is safe even for adds.
+                sock.close()
+                sock = self._connect()
+                send_message(sock, opcode, body)
+            reply_opcode, reply, array = recv_message(sock)
+        except OSError as e:
+            if sock is not None:
+                sock.close()
+            self._local.sock = None
+            raise ConnectionError(f"Embedding server at {self.socket_path} is unavailable: {e}") from e
+        if reply_opcode == OP_ERROR:
+            error = ValueError if reply.get('type') == 'ValueError' else RuntimeError
+            raise error(reply.get('error'))
+        return reply, array
+
+    def encode_chunks(self, chunks: list[str]) -> np.ndarray:
+        return self._request(OP_ENCODE_CHUNKS, {'texts': list(chunks)})[1]
+
+    def encode_queries(self, queries: list[str]) -> np.ndarray:
+        return self._request(OP_ENCODE_QUERIES, {'texts': list(queries)})[1]
+
+    def query_chunks(self, query: str, top_k=3, min_similarity=None, filter=None, hybrid=None) -> list[str]:
+        return self.query_chunks_batch([query], top_k, min_similarity, filter, hybrid)[0]
+
+    def query_chunks_batch(self, queries: list[str], top_k=3, min_similarity=None, filter=None,
+                           hybrid=None) -> list[list[str]]:
+        if not queries:
+            return []
+        body = {'queries': list(queries), 'top_k': top_k, 'min_similarity': min_similarity,
+                'filter': _jsonable(filter), 'hybrid': hybrid}
+        return self._request(OP_QUERY, body)[0]['results']
+
+    def add_chunks(self, new_chunks: list[str], metadata=None):
+        if new_chunks:
+            self._request(OP_ADD, {'chunks': list(new_chunks), 'metadata': _jsonable(metadata)})
+
+    def delete_chunks(self, filter: dict) -> int:
+        if not filter:
+            raise ValueError("delete_chunks needs a non-empty filter.")
+        return self._request(OP_DELETE, {'filter': _jsonable(filter)})[0]['deleted']
+
+    def build_index_from_text(self, text, chunk_size=512, overlap=50, metadata=None, batch_size=4096):
+        for batch in batched(iter_chunks(text, chunk_size, overlap), batch_size):
+            self.add_chunks(batch, metadata)
+
+    async def aquery_chunks(self, query: str, top_k=3, min_similarity=None, filter=None, hybrid=None) -> list[str]:
+        return await self.executor.run(self.query_chunks, query, top_k, min_similarity, filter, hybrid)
+
+    async def aquery_chunks_batch(self, queries: list[str], top_k=3, min_similarity=None, filter=None,
+                                  hybrid=None) -> list[list[str]]:
+        return await self.executor.run(self.query_chunks_batch, queries, top_k, min_similarity, filter, hybrid)
+
+    async def aadd_chunks(self, new_chunks: list[str], metadata=None):
+        return await self.executor.run(self.add_chunks, new_chunks, metadata)
+
+    def wait_for_encoder(self, timeout=None) -> bool:
+        try:
+            return self._request(OP_WAIT_ENCODER, {'timeout': timeout})[0]['ready']
+        except ConnectionError as e:
+            logger.warning(str(e))
+            return False
+
+    def index_stats(self) -> dict:
+        reply = self._request(OP_STATUS)[0]
+        reply.pop('encoder', None)
+        reply.pop('caches', None)
+        return reply
+
+    def request_reload(self) -> int:
+        return self._request(OP_RELOAD)[0]['generation']
+
+    def executor_stats(self) -> dict:
+        return self.executor.stats()
+
+    def encoder_stats(self) -> dict:
+        return self._request(OP_STATUS)[0]['encoder']
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counters of the server's query-embedding and result caches."""
+        return self._request(OP_STATUS)[0]['caches']
+
+    def start_warmup(self):
+        """The server owns the encoder and warms it itself."""
+
+    def start_reload_watcher(self, interval=None):
+        """The server owns the index and watches it itself."""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ai_services.embedding_server', description=__doc__.splitlines()[0])
+    parser.add_argument('--socket', default=os.getenv('VECTOR_STORE_SOCKET', '/tmp/ncs-vectors.sock'))
+    args = parser.parse_args(argv)
+    # Run standalone, nothing else configures logging; without this the server is silent.
+    logging.basicConfig(level=logging.INFO)
+
+    # Imported here: vector_store itself imports this module when it runs as a client.
+    from .vector_store import VectorStore, vector_store, create_local_vector_store, initialize_learning_context
+    # With VECTOR_STORE_SOCKET set, the global store is a client of this very server.
+    store = vector_store if isinstance(vector_store, VectorStore) else create_local_vector_store()
+    store.start_warmup()
+    initialize_learning_context(store, background=True)
+    store.start_reload_watcher()
+
+    with EmbeddingServer(args.socket, store) as server:
+        logger.info(f"Embedding server listening on {args.socket}")
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+# ai_services/encoders.py
+import queue
+import threading
+import time
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from logging import getLogger
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+
+logger = getLogger(__name__)
+
+
+class LazyEncoder:
+    """Proxy for a SentenceTransformer that is loaded on first use or warmed in a background thread."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._model is not None
+
+    def start_warmup(self):
+        """Load the model in a daemon thread so startup does not block on it."""
+        with self._start_lock:
+            if self._thread is not None or self._model is not None:
+                return
+            self._thread = threading.Thread(target=self._load, name="encoder-warmup", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None) -> bool:
+        """Start loading if nothing has yet, then block up to `timeout` seconds; True if the model is usable."""
+        self.start_warmup()
+        self._ready.wait(timeout)
+        return self.is_ready
+
+    def encode(self, texts, **kwargs):
+        if self._model is None:
+            self._load()
+        if self._model is None:
+            raise RuntimeError(f"Encoder '{self.model_name}' failed to load: {self._error}")
+        return self._model.encode(texts, **kwargs)
+
+    def _load(self):
+        with self._lock:
+            if self._model is not None or self._error is not None:
+                return
+            started = time.perf_counter()
+            try:
+                # Imported here: pulling in sentence_transformers loads torch, which is slow.
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name)
+                logger.info(f"Loaded encoder '{self.model_name}' in {time.perf_counter() - started:.1f}s")
+            except Exception as e:
+                self._error = e
+                logger.error(f"Failed to load encoder '{self.model_name}': {e}")
+            finally:
+                self._ready.set()
+
+
+class HashingEncoder:
+    """Deterministic bag-of-words encoder that needs no model weights.
+
+    Words are hashed into `n_features` signed buckets, so encoding takes microseconds,
+    starts instantly and gives the same vectors in every process. The default width
+    matches all-MiniLM-L6-v2, so the index costs the same to store and scan. Retrieval
+    quality is well below a sentence embedding model; it is meant for CI, load tests
+    and a low-latency degraded mode.
+    """
+
+    is_ready = True
+
+    def __init__(self, n_features=384):
+        self.model_name = f"hashing-{n_features}"
+        self._vectorizer = HashingVectorizer(n_features=n_features, stop_words='english', norm='l2',
+                                             dtype=np.float32)
+
+    def start_warmup(self):
+        """Nothing to load."""
+
+    def wait(self, timeout=None) -> bool:
+        return True
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        embeddings = self._vectorizer.transform(list(texts)).toarray()
+        # Texts without any word get a fixed unit vector, so every row stays unit length.
+        embeddings[~embeddings.any(axis=1), 0] = 1.0
+        return embeddings
+
+
+# Every backend has LazyEncoder's interface: model_name, is_ready, start_warmup(), wait() and encode().
+ENCODER_BACKENDS = ('sentence-transformers', 'hashing')
+
+
+def create_encoder(backend: str, model_name: str):
+    """The encoder for a backend name; `model_name` only applies to sentence-transformers."""
+    if backend == 'sentence-transformers':
+        return LazyEncoder(model_name)
+    if backend == 'hashing':
+        return HashingEncoder()
+    raise ValueError(f"Unknown encoder backend '{backend}'. Expected one of {ENCODER_BACKENDS}.")
+
+
+class MicroBatchEncoder:
+    """Coalesces concurrent small encode calls into one batched `encode`.
+
+    The first pending request opens a window of `max_wait_ms`; requests arriving
+    before it closes, up to `max_batch_size` texts, are encoded together and each
+    caller gets its own rows back. With `max_wait_ms=0` calls go straight through.
+    """
+
+    def __init__(self, encoder, max_batch_size=32, max_wait_ms=5.0):
+        self.encoder = encoder
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.largest_batch = 0
+        self.total_wait = 0.0
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        if self.max_wait_ms <= 0 or len(texts) == 0 or len(texts) >= self.max_batch_size:
+            return np.asarray(self.encoder.encode(texts), dtype=np.float32)
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((list(texts), future, time.perf_counter()))
+        return future.result()
+
+    def _ensure_worker(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="micro-batch-encoder", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+            while size < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch: list):
+        started = time.perf_counter()
+        texts = [text for request_texts, _, _ in batch for text in request_texts]
+        try:
+            embeddings = np.asarray(self.encoder.encode(texts), dtype=np.float32)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        with self._stats_lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self.texts += len(texts)
+            self.largest_batch = max(self.largest_batch, len(texts))
+            self.total_wait += sum(started - enqueued for _, _, enqueued in batch)
+        offset = 0
+        for request_texts, future, _ in batch:
+            future.set_result(embeddings[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+    def stats(self) -> dict:
+        """Batching settings and how well concurrent requests have been coalesced."""
+        with self._stats_lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait_ms,
+                'queue_depth': self._queue.qsize(),
+                'requests': self.requests,
+                'batches': self.batches,
+                'mean_batch_size': self.texts / self.batches if self.batches else 0.0,
+                'largest_batch': self.largest_batch,
+                'mean_wait_ms': 1000 * self.total_wait / self.requests if self.requests else 0.0,
+            }
+
+
+# Per-process model used by the bulk-ingest pool workers.
+_worker_model = None
+
+
+def _init_worker(model_name: str):
+    global _worker_model
+    try:
+        # One intra-op thread per worker; the pool itself provides the parallelism.
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_batch(texts: list[str]) -> np.ndarray:
+    return np.asarray(_worker_model.encode(texts, batch_size=len(texts)), dtype=np.float32)
+
+
+def create_ingest_pool(model_name: str, workers: int) -> ProcessPoolExecutor:
+    """A process pool whose workers each load the model once, for `encode_parallel`."""
+    # Spawned workers avoid forking a parent that may already hold torch threads.
+    context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                               initializer=_init_worker, initargs=(model_name,))
+
+
+def encode_parallel(pool: ProcessPoolExecutor, texts: list[str], batch_size=256) -> np.ndarray:
+    """Encode texts in batches across `pool`.
+
+    The batches are encoded concurrently; their results are collected in input order
+    and written into one preallocated matrix.
+    """
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    embeddings = None
+    logger.info(f"Encoding {len(texts)} texts in {len(batches)} batches on the ingest pool.")
+    for i, batch_embeddings in enumerate(pool.map(_encode_batch, batches)):
+        if embeddings is None:
+            embeddings = np.empty((len(texts), batch_embeddings.shape[1]), dtype=np.float32)
+        start = i * batch_size
+        embeddings[start:start + len(batch_embeddings)] = batch_embeddings
+    return embeddings
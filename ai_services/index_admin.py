@@ -0,0 +1,46 @@
+# ai_services/index_admin.py
+"""Command-line administration of an on-disk vector index.
+
+    python -m ai_services.index_admin status [--index-dir data/vector_index]
+    python -m ai_services.index_admin reload [--index-dir data/vector_index]
+
+`reload` bumps the manifest generation; every worker running the reload watcher then
+maps the index again and swaps it in between requests.
+"""
+import argparse
+import sys
+
+from .index_storage import SegmentStore
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m ai_services.index_admin', description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('status', 'reload'))
+    parser.add_argument('--index-dir', default='data/vector_index')
+    args = parser.parse_args(argv)
+
+    storage = SegmentStore(args.index_dir)
+    if not storage.exists():
+        print(f"No index found in {args.index_dir}.", file=sys.stderr)
+        return 1
+
+    if args.command == 'reload':
+        try:
+            generation = storage.publish()
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        print(f"Published generation {generation} of {args.index_dir}.")
+        return 0
+
+    generation, embeddings, chunks, _ = storage.load_generation()
+    print(f"index_dir:  {args.index_dir}")
+    print(f"generation: {generation}")
+    print(f"segments:   {len(storage.segments)}")
+    print(f"chunks:     {len(chunks)}")
+    print(f"dimension:  {embeddings.shape[1] if embeddings.ndim == 2 else 0}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
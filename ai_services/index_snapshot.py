@@ -0,0 +1,74 @@
+# ai_services/index_snapshot.py
+from collections import defaultdict
+
+import numpy as np
+
+from .bm25 import BM25Index
+from .index_storage import ChunkTexts
+
+
+class IndexSnapshot:
+    """Immutable view of the index at one version.
+
+    Writers build a new snapshot and swap the store's reference to it, so a query that
+    reads the reference once sees embeddings, chunks, metadata and the derived indexes
+    of the same version. Derived structures that are built lazily (BM25, metadata
+    partitions) are cached on the snapshot and die with it.
+    """
+
+    def __init__(self, embeddings: np.ndarray, chunks: ChunkTexts, metadata: dict, version=0, generation=None,
+                 ann_index=None, quantized=None, deleted=None):
+        self.embeddings = embeddings
+        self.chunks = chunks
+        self.metadata = metadata
+        self.version = version
+        # Manifest generation the snapshot was loaded from or written as; None if never persisted.
+        self.generation = generation
+        self.ann_index = ann_index
+        self.quantized = quantized
+        # Tombstone mask: True for rows deleted but not yet compacted away; None if there are none.
+        self.deleted = deleted
+        self._live_rows = None
+        self._bm25 = None
+        self._partitions = {}
+
+    @classmethod
+    def empty(cls) -> 'IndexSnapshot':
+        return cls(np.empty((0, 0), dtype=np.float32), ChunkTexts(), {})
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @property
+    def n_deleted(self) -> int:
+        return 0 if self.deleted is None else int(self.deleted.sum())
+
+    def live_rows(self):
+        """Sorted ids of rows that are not deleted, or None when every row is live."""
+        if self.deleted is None:
+            return None
+        if self._live_rows is None:
+            self._live_rows = np.flatnonzero(~self.deleted)
+        return self._live_rows
+
+    def bm25(self) -> BM25Index:
+        """The BM25 index over this snapshot's chunks, built on first use."""
+        if self._bm25 is None:
+            # Build aside and assign once, so concurrent readers never see a half-built index.
+            bm25 = BM25Index()
+            bm25.build(self.chunks)
+            self._bm25 = bm25
+        return self._bm25
+
+    def partition(self, column: str) -> dict:
+        """Row ids grouped by value for one metadata column, built on first use."""
+        partition = self._partitions.get(column)
+        if partition is None:
+            groups = defaultdict(list)
+            for row, value in enumerate(self.metadata.get(column) or [None] * len(self.chunks)):
+                # Merged duplicates carry a list of values and belong to each of them.
+                for item in (value if isinstance(value, list) else [value]):
+                    groups[item].append(row)
+            partition = {value: np.asarray(rows, dtype=np.int64) for value, rows in groups.items()}
+            self._partitions[column] = partition
+        return partition
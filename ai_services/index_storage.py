@@ -0,0 +1,559 @@
+# ai_services/index_storage.py
+import os
+import fcntl
+import glob
+import hashlib
+import json
+import mmap
+import shutil
+import threading
+import uuid
+from collections.abc import Sequence
+from contextlib import contextmanager
+from logging import getLogger
+
+import numpy as np
+
+logger = getLogger(__name__)
+
+EMBEDDINGS_FILE = 'embeddings.npy'
+OFFSETS_FILE = 'offsets.npy'
+TEXTS_FILE = 'texts.bin'
+METADATA_FILE = 'metadata.json'
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_LOCK_FILE = 'manifest.lock'
+TOMBSTONES_FILE = 'tombstones.npy'
+
+
+class IndexChangedError(RuntimeError):
+    """Raised when a rewrite finds the manifest moved past the generation it was based on."""
+
+
+class ChunkTexts(Sequence):
+    """Read-only sequence of chunk strings backed by a UTF-8 blob and an offset table."""
+
+    def __init__(self, blob=b'', offsets=None):
+        self._blob = blob
+        self._offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+
+    @classmethod
+    def from_list(cls, texts: list[str]) -> 'ChunkTexts':
+        encoded = [text.encode('utf-8') for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(b''.join(encoded), offsets)
+
+    @classmethod
+    def concat(cls, parts: list['ChunkTexts']) -> 'ChunkTexts':
+        """Join several sequences (or StackedTexts) into one, copying their blobs."""
+        blobs, offsets, base = [], [np.zeros(1, dtype=np.int64)], 0
+        parts = [piece for part in parts
+                 for piece in ((part.base, part.tail) if isinstance(part, StackedTexts) else (part,))]
+        for part in parts:
+            blobs.append(bytes(part._blob[:part.nbytes]))
+            offsets.append(np.asarray(part._offsets[1:], dtype=np.int64) + base)
+            base += part.nbytes
+        return cls(b''.join(blobs), np.concatenate(offsets))
+
+    def extended(self, texts: list[str]) -> 'ChunkTexts':
+        """Return a new sequence holding the current chunks followed by `texts`."""
+        return ChunkTexts.concat([self, ChunkTexts.from_list(texts)])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._offsets[-1])
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return bytes(self._blob[start:end]).decode('utf-8')
+
+
+def _grown(array: np.ndarray, used: int, needed: int) -> np.ndarray:
+    """`array` if it can hold `needed` rows, else a copy of its first `used` rows with doubled capacity."""
+    if needed <= len(array):
+        return array
+    grown = np.empty((max(needed, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[:used] = array[:used]
+    return grown
+
+
+class StackedRows:
+    """Read-only float32 matrix made of a base matrix followed by appended rows, without joining them.
+
+    Supports what the search paths use: len, shape, slices, row indexing, products with
+    query matrices and conversion with np.asarray (which does copy both parts).
+    """
+
+    def __init__(self, base: np.ndarray, tail: np.ndarray):
+        self.base = base
+        self.tail = tail
+        self.shape = (len(base) + len(tail), tail.shape[1])
+        self.dtype = np.dtype(np.float32)
+        self.ndim = 2
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        n = len(self.base)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1 and stop <= n:
+                return self.base[start:stop]
+            if step == 1 and start >= n:
+                return self.tail[start - n:stop - n]
+            key = np.arange(start, stop, step)
+        elif isinstance(key, (int, np.integer)):
+            key = int(key) + len(self) if key < 0 else int(key)
+            return self.base[key] if key < n else self.tail[key - n]
+        rows = np.asarray(key)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        rows = np.where(rows < 0, rows + len(self), rows)
+        in_base = rows < n
+        selected = np.empty((len(rows), self.shape[1]), dtype=np.float32)
+        selected[in_base] = self.base[rows[in_base]]
+        selected[~in_base] = self.tail[rows[~in_base] - n]
+        return selected
+
+    def __matmul__(self, other):
+        return np.concatenate([np.asarray(self.base @ other), self.tail @ other])
+
+    def __array__(self, dtype=None, copy=None):
+        return np.concatenate([self.base, self.tail]).astype(dtype or np.float32, copy=False)
+
+
+class StackedTexts(Sequence):
+    """Chunk texts of a base sequence followed by appended ones, without joining their blobs."""
+
+    def __init__(self, base: ChunkTexts, tail: ChunkTexts):
+        self.base = base
+        self.tail = tail
+
+    @property
+    def nbytes(self) -> int:
+        return self.base.nbytes + self.tail.nbytes
+
+    def __len__(self):
+        return len(self.base) + len(self.tail)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+        n = len(self.base)
+        return self.base[i] if i < n else self.tail[i - n]
+
+
+class GrowableIndexBuffer:
+    """Capacity-doubling float32 matrix and text blob for the rows added since the index was loaded.
+
+    Appends write past the filled rows and reallocate only when capacity runs out, so many
+    small adds cost amortized O(1) per row instead of copying the whole index each time.
+    The loaded rows are not copied: they stay memory-mapped (and shared with other workers
+    through the page cache) and are stacked in front of the appended ones. The views handed
+    out cover filled rows only, which are never written again, so snapshots built on them
+    stay immutable while later rows are appended.
+    """
+
+    def __init__(self, embeddings: np.ndarray, texts: ChunkTexts, min_capacity=1024):
+        if isinstance(embeddings, StackedRows):
+            # Rows stacked by an earlier buffer; join them rather than stack ever deeper.
+            embeddings = np.asarray(embeddings)
+        if isinstance(texts, StackedTexts):
+            texts = ChunkTexts.concat([texts])
+        self._base_embeddings = embeddings
+        self._base_texts = texts
+        self.rows = 0
+        self.min_capacity = min_capacity
+        self._matrix = None
+        self._offsets = np.zeros(min_capacity + 1, dtype=np.int64)
+        self._blob = np.empty(min_capacity * 256, dtype=np.uint8)
+
+    @property
+    def nbytes(self) -> int:
+        """Private memory held for appended rows; the mapped base is not counted."""
+        matrix_bytes = self._matrix.nbytes if self._matrix is not None else 0
+        return int(matrix_bytes + self._offsets.nbytes + self._blob.nbytes)
+
+    def append(self, embeddings: np.ndarray, texts: list[str]) -> tuple[np.ndarray, ChunkTexts]:
+        """Append rows and return views of every row, loaded and appended: (float32 matrix, chunk texts)."""
+        if self._matrix is None:
+            self._matrix = np.empty((max(self.min_capacity, len(embeddings)), embeddings.shape[1]), dtype=np.float32)
+        rows = self.rows + len(texts)
+        self._matrix = _grown(self._matrix, self.rows, rows)
+        self._matrix[self.rows:rows] = embeddings
+
+        encoded = [text.encode('utf-8') for text in texts]
+        start = int(self._offsets[self.rows])
+        self._offsets = _grown(self._offsets, self.rows + 1, rows + 1)
+        np.cumsum([len(b) for b in encoded], out=self._offsets[self.rows + 1:rows + 1])
+        self._offsets[self.rows + 1:rows + 1] += start
+        end = int(self._offsets[rows])
+        self._blob = _grown(self._blob, start, end)
+        self._blob[start:end] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        self.rows = rows
+        matrix, chunks = self._matrix[:rows], ChunkTexts(self._blob[:end], self._offsets[:rows + 1])
+        if not len(self._base_texts):
+            return matrix, chunks
+        return StackedRows(self._base_embeddings, matrix), StackedTexts(self._base_texts, chunks)
+
+
+def _replace_atomically(path: str, write, mode='wb'):
+    """Write a file through a temporary sibling and move it into place."""
+    # Unique per writer, so concurrent processes never rename each other's half-written file.
+    tmp_path = f"{path}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, mode) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def derived_path(index_dir: str, kind: str, rows_id: str, n_rows: int) -> str:
+    """Directory of a structure derived from the index rows (ANN lists, compact matrices).
+
+    `rows_id` changes whenever the index is rewritten and appends only add rows after it,
+    so together with the row count it identifies exactly which rows the structure covers.
+    """
+    return os.path.join(index_dir, f"{kind}-{rows_id}-{n_rows}")
+
+
+def save_derived(directory: str, arrays: dict):
+    """Write `arrays` as .npy files into `directory` atomically and remove older builds of the same kind.
+
+    Readers that still map an older build keep reading it; the files disappear when they let go.
+    """
+    if os.path.isdir(directory):
+        return
+    tmp_directory = f"{directory}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp"
+    os.makedirs(tmp_directory)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_directory, f"{name}.npy"), array)
+    try:
+        os.rename(tmp_directory, directory)
+    except OSError:
+        # Another process saved the same build first.
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+    kind = os.path.basename(directory).split('-', 1)[0]
+    for path in glob.glob(os.path.join(glob.escape(os.path.dirname(directory)), f"{kind}-*")):
+        if path != directory and not path.endswith('.tmp'):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def load_derived(directory: str, names: tuple, mmap_mode=None):
+    """Arrays saved by `save_derived`, or None if the build is missing or was removed meanwhile."""
+    try:
+        return {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in names}
+    except (OSError, ValueError, EOFError):
+        return None
+
+
+def merge_columns(parts: list[tuple[dict, int]]) -> dict:
+    """Concatenate per-chunk metadata columns of consecutive row ranges, padding gaps with None."""
+    names = list(dict.fromkeys(name for columns, _ in parts for name in columns))
+    merged = {name: [] for name in names}
+    for columns, n_rows in parts:
+        for name in names:
+            merged[name].extend(columns.get(name) or [None] * n_rows)
+    return merged
+
+
+def _write_files(directory: str, embeddings: np.ndarray, texts: ChunkTexts, columns=None):
+    """Write the float32 matrix, the offset table, the text blob and metadata columns to `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if isinstance(texts, StackedTexts):
+        texts = ChunkTexts.concat([texts])
+    if columns:
+        _replace_atomically(os.path.join(directory, METADATA_FILE),
+                            lambda f: json.dump(columns, f, ensure_ascii=False), mode='w')
+    _replace_atomically(os.path.join(directory, TEXTS_FILE), lambda f: f.write(texts._blob[:texts.nbytes]))
+    _replace_atomically(os.path.join(directory, OFFSETS_FILE), lambda f: np.save(f, np.asarray(texts._offsets)))
+    _replace_atomically(os.path.join(directory, EMBEDDINGS_FILE), lambda f: np.save(f, embeddings))
+
+
+def _has_files(directory: str) -> bool:
+    return all(os.path.exists(os.path.join(directory, name)) for name in (EMBEDDINGS_FILE, OFFSETS_FILE, TEXTS_FILE))
+
+
+def _map_blob(path: str):
+    if os.path.getsize(path) == 0:
+        return b''
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _map_files(directory: str) -> tuple[np.ndarray, ChunkTexts, dict]:
+    """Map one matrix/offsets/blob triple into memory without reading it eagerly."""
+    embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode='r')
+    offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode='r')
+    blob = _map_blob(os.path.join(directory, TEXTS_FILE))
+    if len(offsets) - 1 != len(embeddings):
+        raise ValueError(f"Segment {directory} is inconsistent: {len(offsets) - 1} texts for {len(embeddings)} vectors.")
+    columns = {}
+    metadata_path = os.path.join(directory, METADATA_FILE)
+    if os.path.exists(metadata_path):
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            columns = json.load(f)
+    return embeddings, ChunkTexts(blob, offsets), columns
+
+
+class SegmentStore:
+    """Append-only index layout: immutable segment directories listed in manifest.json.
+
+    Each add writes one new segment, so ingestion cost scales with the new data.
+    `compact()` merges the listed segments back into one.
+
+    A single segment is mapped in place, so every process reading it shares the same
+    page-cache pages. Several segments have to be concatenated, which would give each
+    process a private copy; with `shared_dir` set (ideally on tmpfs, e.g. /dev/shm) the
+    first process to load a segment list publishes the merged copy there and every other
+    process maps that copy read-only instead.
+    """
+
+    def __init__(self, index_dir: str, shared_dir=None):
+        self.index_dir = index_dir
+        self.shared_dir = shared_dir
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.index_dir, MANIFEST_FILE)) or _has_files(self.index_dir)
+
+    @contextmanager
+    def _manifest_lock(self):
+        """Serialize manifest read-modify-writes across threads and across worker processes."""
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            with open(os.path.join(self.index_dir, MANIFEST_LOCK_FILE), 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    @contextmanager
+    def exclusive(self, name: str):
+        """Hold a cross-process lock named `name` on this index, e.g. so one worker at a time builds it.
+
+        Separate from the manifest lock, so the holder can still append and rewrite.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(os.path.join(self.index_dir, f"{name}.lock"), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    @property
+    def segments(self) -> list[str]:
+        manifest = self._read_manifest()
+        return list(manifest['segments']) if manifest else []
+
+    def _read_manifest(self):
+        path = os.path.join(self.index_dir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def manifest_value(self, key: str, default=None):
+        manifest = self._read_manifest()
+        return manifest.get(key, default) if manifest else default
+
+    def _write_manifest(self, manifest: dict) -> int:
+        manifest['generation'] = manifest.get('generation', 0) + 1
+        manifest.setdefault('rows_id', uuid.uuid4().hex[:12])
+        _replace_atomically(os.path.join(self.index_dir, MANIFEST_FILE),
+                            lambda f: json.dump(manifest, f, indent=2), mode='w')
+        return manifest['generation']
+
+    def _write_segment(self, embeddings: np.ndarray, texts: ChunkTexts, columns=None) -> str:
+        name = f"seg-{uuid.uuid4().hex[:12]}"
+        _write_files(os.path.join(self.index_dir, name), embeddings, texts, columns)
+        return name
+
+    def _adopt_flat_layout(self):
+        """Move an index written as a single top-level file set into its first segment."""
+        name = f"seg-{uuid.uuid4().hex[:12]}"
+        os.makedirs(os.path.join(self.index_dir, name))
+        for file_name in (EMBEDDINGS_FILE, OFFSETS_FILE, TEXTS_FILE):
+            os.replace(os.path.join(self.index_dir, file_name), os.path.join(self.index_dir, name, file_name))
+        self._write_manifest({'segments': [name]})
+        logger.info(f"Converted {self.index_dir} to the segmented layout.")
+
+    def append(self, embeddings: np.ndarray, texts: ChunkTexts, columns=None) -> tuple[int, int]:
+        """Write a new segment and list it in the manifest; returns the segment count and new generation."""
+        name = self._write_segment(embeddings, texts, columns)
+        with self._manifest_lock():
+            manifest = self._read_manifest() or {'segments': []}
+            manifest['segments'].append(name)
+            generation = self._write_manifest(manifest)
+            return len(manifest['segments']), generation
+
+    def rewrite(self, embeddings: np.ndarray, texts: ChunkTexts, columns=None, expected_generation=None,
+                **manifest_fields) -> int:
+        """Replace every segment with a single one holding `embeddings` and `texts`; returns the new generation.
+
+        With `expected_generation`, raises IndexChangedError instead if another writer has
+        changed the manifest since then, so rows it appended are not thrown away.
+        """
+        name = self._write_segment(embeddings, texts, columns)
+        with self._manifest_lock():
+            old = self.segments
+            manifest = self._read_manifest() or {}
+            generation = manifest.get('generation', 0)
+            if expected_generation is not None and generation != expected_generation:
+                self._remove_segments([name])
+                raise IndexChangedError(f"Index {self.index_dir} moved from generation {expected_generation} "
+                                        f"to {generation}.")
+            # The rewritten rows are all live, so earlier tombstones no longer apply.
+            manifest.pop('tombstones', None)
+            # New rows, so structures derived from the old ones no longer apply either.
+            manifest_fields.setdefault('rows_id', uuid.uuid4().hex[:12])
+            generation = self._write_manifest({**manifest, **manifest_fields, 'segments': [name]})
+        self._remove_segments(old)
+        return generation
+
+    def write_tombstones(self, deleted: np.ndarray) -> int:
+        """Persist the deleted-row bitmap (over rows in manifest order); returns the new generation.
+
+        Merging segments keeps row order, so the bitmap stays valid until `rewrite()` drops it.
+        """
+        with self._manifest_lock():
+            manifest = self._read_manifest()
+            if manifest is None:
+                raise ValueError(f"No index manifest in {self.index_dir} to attach tombstones to.")
+            _replace_atomically(os.path.join(self.index_dir, TOMBSTONES_FILE),
+                                lambda f: np.save(f, np.packbits(deleted)))
+            manifest['tombstones'] = {'file': TOMBSTONES_FILE, 'rows': len(deleted), 'deleted': int(deleted.sum())}
+            return self._write_manifest(manifest)
+
+    def load_tombstones(self, n_rows: int):
+        """Deleted-row mask of length `n_rows`, or None if nothing is deleted. Later rows are live."""
+        tombstones = self.manifest_value('tombstones')
+        if not tombstones:
+            return None
+        bits = np.load(os.path.join(self.index_dir, tombstones['file']))
+        deleted = np.zeros(n_rows, dtype=bool)
+        rows = min(n_rows, tombstones['rows'])
+        deleted[:rows] = np.unpackbits(bits, count=tombstones['rows'])[:rows].astype(bool)
+        return deleted if deleted.any() else None
+
+    def publish(self) -> int:
+        """Bump the manifest generation without changing its segments, so every reader reloads."""
+        with self._manifest_lock():
+            manifest = self._read_manifest()
+            if manifest is None:
+                raise ValueError(f"No index manifest in {self.index_dir} to publish.")
+            return self._write_manifest(manifest)
+
+    def load(self) -> tuple[np.ndarray, ChunkTexts, dict]:
+        """Map every segment. A single segment is used in place; several are concatenated."""
+        return self.load_generation()[1:]
+
+    def load_generation(self) -> tuple[int, np.ndarray, ChunkTexts, dict]:
+        """Like `load()`, also returning the manifest generation the segments were listed in."""
+        generation, _, *loaded = self.load_versioned()
+        return (generation, *loaded)
+
+    def load_versioned(self) -> tuple[int, str, np.ndarray, ChunkTexts, dict]:
+        """Like `load_generation()`, also returning the `rows_id` that keys derived structures."""
+        with self._manifest_lock():
+            if self._read_manifest() is None and _has_files(self.index_dir):
+                self._adopt_flat_layout()
+            manifest = self._read_manifest() or {'segments': []}
+        names = manifest['segments']
+        if self.shared_dir and len(names) > 1:
+            loaded = self._load_shared(names)
+        else:
+            loaded = self._load_segments(names)
+        if self.shared_dir:
+            self._remove_stale_shared()
+        # Manifests written before rows_id existed all share one id until their next rewrite.
+        return (manifest.get('generation', 0), manifest.get('rows_id', 'base'), *loaded)
+
+    def _load_segments(self, names: list[str]) -> tuple[np.ndarray, ChunkTexts, dict]:
+        parts = [_map_files(os.path.join(self.index_dir, name)) for name in names]
+        if not parts:
+            return np.empty((0, 0), dtype=np.float32), ChunkTexts(), {}
+        if len(parts) == 1:
+            return parts[0]
+        embeddings = np.concatenate([part[0] for part in parts])
+        columns = merge_columns([(part[2], len(part[1])) for part in parts])
+        return embeddings, ChunkTexts.concat([part[1] for part in parts]), columns
+
+    @property
+    def _shared_prefix(self) -> str:
+        index_key = hashlib.sha1(os.path.abspath(self.index_dir).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.shared_dir, f"ncs-index-{index_key}-")
+
+    def _shared_path(self, names: list[str]) -> str:
+        # Segment names are unique and their contents immutable, so the list identifies the merged copy.
+        return self._shared_prefix + hashlib.sha1('\n'.join(names).encode('utf-8')).hexdigest()[:12]
+
+    def _load_shared(self, names: list[str]) -> tuple[np.ndarray, ChunkTexts, dict]:
+        """Map the merged copy of `names` from `shared_dir`, publishing it first if no process has yet."""
+        directory = self._shared_path(names)
+        try:
+            return _map_files(directory)
+        except FileNotFoundError:
+            pass
+        os.makedirs(self.shared_dir, exist_ok=True)
+        with open(f"{directory}.lock", 'w') as lock_file:
+            # Workers starting together would all merge the segments; one does while the others wait.
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not os.path.isdir(directory):
+                embeddings, texts, columns = self._load_segments(names)
+                tmp_directory = f"{directory}.{uuid.uuid4().hex[:8]}.tmp"
+                _write_files(tmp_directory, embeddings, texts, columns)
+                # Renaming a directory is atomic, so readers see the copy whole or not at all.
+                os.rename(tmp_directory, directory)
+                logger.info(f"Published {len(texts)} rows of {self.index_dir} to {directory}.")
+        return _map_files(directory)
+
+    def _remove_stale_shared(self):
+        """Remove merged copies of this index that no longer match its manifest."""
+        names = self.segments
+        current = self._shared_path(names) if len(names) > 1 else None
+        for path in glob.glob(f"{glob.escape(self._shared_prefix)}*"):
+            if (current and path.startswith(current)) or path.endswith('.tmp'):
+                continue
+            # Processes that still map a removed copy keep reading it until they reload.
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+
+    def compact(self) -> bool:
+        """Merge all current segments into one. Segments appended meanwhile are kept after it."""
+        names = self.segments
+        if len(names) <= 1:
+            return False
+        embeddings, texts, columns = self._load_segments(names)
+        merged = self._write_segment(embeddings, texts, columns)
+        with self._manifest_lock():
+            manifest = self._read_manifest()
+            if not all(name in manifest['segments'] for name in names):
+                # The index was rewritten meanwhile; the merged copy is stale.
+                self._remove_segments([merged])
+                return False
+            remaining = [name for name in manifest['segments'] if name not in names]
+            manifest['segments'] = [merged] + remaining
+            self._write_manifest(manifest)
+        self._remove_segments(names)
+        logger.info(f"Compacted {len(names)} segments in {self.index_dir} into {merged}.")
+        return True
+
+    def _remove_segments(self, names: list[str]):
+        # Open mappings in other processes stay valid after the files are unlinked.
+        for name in names:
+            shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
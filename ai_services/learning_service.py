@@ -1,4 +1,5 @@
 # ai_services/learning_service.py
+from .vector_store import vector_store, initialize_learning_context
 
 class LearningService:
     """A service to handle learning-related functionalities."""
@@ -9,6 +10,12 @@ class LearningService:
     def initialize(self):
         """Initializes the learning service."""
         print("INFO:     Initializing Learning Service...")
+        # Warm the embedding model in the background so the server can start accepting requests.
+        vector_store.start_warmup()
+        # Adopt the prebuilt index artifacts, or build the index in the background if there are none.
+        initialize_learning_context(background=True)
+        # Pick up index snapshots published by other workers or the index_admin CLI.
+        vector_store.start_reload_watcher()
         self.initialized = True
         print("INFO:     Learning Service initialized.")
 
@@ -0,0 +1,183 @@
+# ai_services/namespaces.py
+import os
+import threading
+from collections import OrderedDict
+from logging import getLogger
+
+import numpy as np
+
+from .index_storage import ChunkTexts, IndexChangedError, SegmentStore
+from .utils.vector_math import top_k_indices
+from .vector_store import VectorStore, vector_store
+
+logger = getLogger(__name__)
+
+
+class _Namespace:
+    """One user's chunks: a contiguous embedding matrix, its texts and a document id per row,
+    as listed in manifest generation `generation`."""
+
+    def __init__(self, generation: int, embeddings: np.ndarray, texts: ChunkTexts, document_ids: list):
+        self.generation = generation
+        self.embeddings = embeddings
+        self.texts = texts
+        self.document_ids = np.asarray(document_ids, dtype=object)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.embeddings.nbytes + self.texts.nbytes + 8 * len(self.document_ids))
+
+
+class NamespacedVectorStore:
+    """Per-user vector indexes for uploaded documents.
+
+    Each user's chunks live in their own segment directory under `root_dir`, are mapped
+    on first use and evicted least-recently-used once `memory_budget_bytes` is exceeded,
+    so a chat query only scans the asking user's rows. Encoding and the query-embedding
+    cache are shared with the global VectorStore.
+    """
+
+    def __init__(self, store: VectorStore, root_dir='data/user_indexes', memory_budget_bytes=256 * 1024 * 1024,
+                 max_segments=8):
+        self.store = store
+        self.root_dir = root_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_segments = max_segments
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _storage(self, user_id) -> SegmentStore:
+        return SegmentStore(os.path.join(self.root_dir, str(user_id)))
+
+    def _namespace(self, user_id):
+        """Return the user's namespace, mapping it from disk unless the resident copy is current.
+
+        Other workers add and remove documents too, so a resident namespace is only reused
+        while its generation matches the user's manifest.
+        """
+        key = str(user_id)
+        storage = self._storage(key)
+        generation = storage.manifest_value('generation')
+        with self._lock:
+            namespace = self._loaded.get(key)
+            if namespace is not None and namespace.generation == generation:
+                self._loaded.move_to_end(key)
+                return namespace
+
+        if generation is None and not storage.exists():
+            self._invalidate(key)
+            return None
+        if len(storage.segments) > self.max_segments:
+            storage.compact()
+        try:
+            generation, embeddings, texts, columns = storage.load_generation()
+        except FileNotFoundError:
+            # A rewrite removed the listed segments between reading the manifest and mapping them.
+            generation, embeddings, texts, columns = storage.load_generation()
+        namespace = _Namespace(generation, embeddings, texts, columns.get('document_id') or [None] * len(texts))
+
+        with self._lock:
+            resident = self._loaded.get(key)
+            # A load that overlapped a write may finish last; never replace a newer copy with it.
+            if resident is not None and resident.generation > generation:
+                namespace = resident
+            self._loaded[key] = namespace
+            self._loaded.move_to_end(key)
+            self._evict()
+        return namespace
+
+    def _evict(self):
+        resident = sum(namespace.nbytes for namespace in self._loaded.values())
+        # Always keep the most recently used namespace, even if it alone exceeds the budget.
+        while resident > self.memory_budget_bytes and len(self._loaded) > 1:
+            user_id, namespace = self._loaded.popitem(last=False)
+            resident -= namespace.nbytes
+            logger.info(f"Evicted vector namespace for user {user_id} ({namespace.nbytes} bytes).")
+
+    def _invalidate(self, user_id):
+        with self._lock:
+            self._loaded.pop(str(user_id), None)
+
+    def add_document(self, user_id, document_id, chunks: list[str]):
+        """Encode a document's chunks and append them to the user's namespace."""
+        chunks = [chunk for chunk in chunks if chunk and chunk.strip()]
+        if not chunks:
+            return
+        embeddings = self.store.encode_chunks(chunks)
+        self._storage(user_id).append(embeddings, ChunkTexts.from_list(chunks),
+                                      {'document_id': [str(document_id)] * len(chunks)})
+        self._invalidate(user_id)
+        logger.info(f"Indexed {len(chunks)} chunks of document {document_id} for user {user_id}.")
+
+    def remove_document(self, user_id, document_id, attempts=3) -> bool:
+        """Drop a document's rows by rewriting the user's namespace without them.
+
+        If another worker changed the namespace meanwhile, reload it and try again, so
+        documents it appended are kept.
+        """
+        storage = self._storage(user_id)
+        for attempt in range(attempts):
+            namespace = self._namespace(user_id)
+            if namespace is None:
+                return False
+            keep = np.flatnonzero(namespace.document_ids != str(document_id))
+            if len(keep) == len(namespace.document_ids):
+                return False
+            try:
+                storage.rewrite(np.ascontiguousarray(namespace.embeddings[keep], dtype=np.float32),
+                                ChunkTexts.from_list([namespace.texts[i] for i in keep]),
+                                {'document_id': namespace.document_ids[keep].tolist()},
+                                expected_generation=namespace.generation)
+            except IndexChangedError as e:
+                if attempt == attempts - 1:
+                    raise
+                logger.info(f"{e} Reloading before removing document {document_id}.")
+                continue
+            finally:
+                self._invalidate(user_id)
+            return True
+
+    def query(self, user_id, query: str, top_k=5, document_id=None) -> list[dict]:
+        """Most similar chunks among the user's own documents, optionally one document only.
+
+        Returns [] if the encoder is not ready, so callers can fall back to keyword search.
+        """
+        namespace = self._namespace(user_id)
+        if namespace is None or len(namespace.texts) == 0:
+            return []
+        rows = np.arange(len(namespace.texts))
+        if document_id is not None:
+            rows = np.flatnonzero(namespace.document_ids == str(document_id))
+            if len(rows) == 0:
+                return []
+
+        if not self.store.wait_for_encoder():
+            logger.warning("Encoder is not ready. Skipping semantic search over user documents.")
+            return []
+        query_embedding = self.store.encode_queries([query])[0]
+        scores = np.asarray(namespace.embeddings[rows], dtype=np.float32) @ query_embedding
+        best = top_k_indices(scores, top_k)
+        return [
+            {'content': namespace.texts[rows[i]], 'document_id': namespace.document_ids[rows[i]],
+             'score': float(scores[i])}
+            for i in best
+        ]
+
+    async def aquery(self, user_id, query: str, top_k=5, document_id=None) -> list[dict]:
+        """`query` on the store's bounded executor, for async handlers."""
+        return await self.store.executor.run(self.query, user_id, query, top_k, document_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'resident_namespaces': len(self._loaded),
+                'resident_bytes': sum(namespace.nbytes for namespace in self._loaded.values()),
+                'memory_budget_bytes': self.memory_budget_bytes,
+            }
+
+
+# Global instance; like the shared index, user indexes of another encoder backend live apart.
+_backend = vector_store.encoder_backend
+namespaced_store = NamespacedVectorStore(
+    vector_store, 'data/user_indexes' if _backend == 'sentence-transformers' else f'data/user_indexes-{_backend}'
+)
@@ -0,0 +1,115 @@
+# ai_services/prebuilt_artifacts.py
+import os
+import glob
+import hashlib
+import json
+import pickle
+from logging import getLogger
+
+import numpy as np
+
+logger = getLogger(__name__)
+
+CHUNKS_FILE = 'chunks.pkl'
+EMBEDDINGS_FILE = 'embeddings.pkl'
+METADATA_FILE = 'metadata.pkl'
+
+# Model the shipped artifacts were encoded with, and dimensions of known models so
+# validation does not need to load the encoder.
+PREBUILT_MODEL_NAME = 'all-MiniLM-L6-v2'
+KNOWN_DIMENSIONS = {'all-MiniLM-L6-v2': 384}
+# Part of the fingerprint; bump it when the import derives different metadata, so older imports are redone.
+IMPORT_VERSION = 2
+
+
+class _CompatUnpickler(pickle.Unpickler):
+    """Resolve arrays pickled under NumPy 2's `numpy._core` on NumPy 1.x, and vice versa."""
+
+    def find_class(self, module, name):
+        try:
+            return super().find_class(module, name)
+        except ModuleNotFoundError:
+            if module.startswith('numpy._core'):
+                return super().find_class(module.replace('numpy._core', 'numpy.core', 1), name)
+            if module.startswith('numpy.core'):
+                return super().find_class(module.replace('numpy.core', 'numpy._core', 1), name)
+            raise
+
+
+def _load_pickle(path: str):
+    with open(path, 'rb') as f:
+        return _CompatUnpickler(f).load()
+
+
+def artifacts_present(data_dir: str) -> bool:
+    return all(os.path.getsize(os.path.join(data_dir, name)) > 0
+               if os.path.exists(os.path.join(data_dir, name)) else False
+               for name in (CHUNKS_FILE, EMBEDDINGS_FILE, METADATA_FILE))
+
+
+def artifact_fingerprint(data_dir: str, model_name: str) -> str:
+    """Cheap identity of the artifact set: model name plus each file's size and mtime."""
+    digest = hashlib.sha256(f"{model_name}:{IMPORT_VERSION}".encode('utf-8'))
+    for name in (CHUNKS_FILE, EMBEDDINGS_FILE, METADATA_FILE):
+        stat = os.stat(os.path.join(data_dir, name))
+        digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _roadmap_slugs(roadmaps_dir: str) -> dict:
+    """Map each topic id in the roadmap JSON files to the roadmap(s) it belongs to."""
+    slugs = {}
+    for path in sorted(glob.glob(os.path.join(roadmaps_dir, '*.json'))):
+        slug = os.path.splitext(os.path.basename(path))[0]
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                topic_ids = list(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read {path} to tag prebuilt chunks: {e}")
+            continue
+        for topic_id in topic_ids:
+            slugs.setdefault(topic_id, []).append(slug)
+    return slugs
+
+
+def load_prebuilt_artifacts(data_dir: str, expected_dimension: int,
+                            roadmaps_dir=None) -> tuple[list[str], np.ndarray, list[dict]]:
+    """Read and validate chunks.pkl, embeddings.pkl and metadata.pkl.
+
+    Returns the chunk texts, a float32 embedding matrix and one metadata dict per chunk.
+    The chunk ids are the topic ids of the roadmap JSON files in `roadmaps_dir` (default
+    `<data_dir>/roadmaps`), which gives each chunk its `roadmap`.
+    Raises ValueError if the three files do not describe the same chunks.
+    """
+    chunks = _load_pickle(os.path.join(data_dir, CHUNKS_FILE))
+    documents = list(chunks.get('documents', [])) if isinstance(chunks, dict) else list(chunks)
+    ids = list(chunks.get('ids', [])) if isinstance(chunks, dict) else []
+    metadata = list(_load_pickle(os.path.join(data_dir, METADATA_FILE)))
+    embeddings = np.asarray(_load_pickle(os.path.join(data_dir, EMBEDDINGS_FILE)), dtype=np.float32)
+
+    if not documents:
+        raise ValueError("Prebuilt chunks.pkl contains no documents.")
+    if embeddings.ndim != 2 or len(embeddings) != len(documents):
+        raise ValueError(f"Prebuilt embeddings have shape {embeddings.shape} for {len(documents)} chunks.")
+    if embeddings.shape[1] != expected_dimension:
+        raise ValueError(f"Prebuilt embeddings have dimension {embeddings.shape[1]}, expected {expected_dimension}.")
+    if ids and len(ids) != len(documents):
+        raise ValueError(f"Prebuilt chunks.pkl has {len(ids)} ids for {len(documents)} documents.")
+    if len(metadata) != len(documents):
+        raise ValueError(f"Prebuilt metadata.pkl has {len(metadata)} entries for {len(documents)} chunks.")
+    if not np.isfinite(embeddings).all():
+        raise ValueError("Prebuilt embeddings contain non-finite values.")
+
+    slugs = _roadmap_slugs(roadmaps_dir or os.path.join(data_dir, 'roadmaps')) if ids else {}
+    entries = []
+    for i, entry in enumerate(metadata):
+        entry = {'source': 'roadmap', **(entry or {})}
+        if ids:
+            entry['chunk_id'] = ids[i]
+            roadmaps = slugs.get(ids[i], [])
+            if roadmaps and entry.get('roadmap') is None:
+                entry['roadmap'] = roadmaps[0] if len(roadmaps) == 1 else roadmaps
+        entries.append(entry)
+    if ids and not any(entry.get('roadmap') for entry in entries):
+        logger.warning("No prebuilt chunk matched a roadmap topic; they cannot be filtered by roadmap.")
+    return documents, embeddings, entries
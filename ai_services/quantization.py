@@ -0,0 +1,97 @@
+# ai_services/quantization.py
+from logging import getLogger
+
+import numpy as np
+
+from .index_storage import derived_path, load_derived, save_derived
+from .utils.vector_math import top_k_indices
+
+logger = getLogger(__name__)
+
+STORAGE_DTYPES = ('float32', 'float16', 'int8')
+
+
+class QuantizedEmbeddings:
+    """Compact float16 or int8 copy of a unit-length embedding matrix.
+
+    Used for the first, approximate scoring pass. int8 rows are scaled per
+    dimension, and the scale is folded into the query so scoring never
+    materializes a dequantized matrix.
+    """
+
+    def __init__(self, dtype: str, data: np.ndarray, scale=None):
+        self.dtype = dtype
+        self.data = data
+        self.scale = scale
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.data.nbytes + (self.scale.nbytes if self.scale is not None else 0))
+
+    @classmethod
+    def from_embeddings(cls, embeddings: np.ndarray, dtype: str, block_size=65_536) -> 'QuantizedEmbeddings':
+        if dtype == 'float16':
+            return cls(dtype, np.asarray(embeddings, dtype=np.float16))
+        if dtype != 'int8':
+            raise ValueError(f"Unsupported quantized dtype '{dtype}'.")
+
+        max_abs = np.zeros(embeddings.shape[1], dtype=np.float32)
+        for start in range(0, len(embeddings), block_size):
+            block = np.abs(np.asarray(embeddings[start:start + block_size], dtype=np.float32))
+            np.maximum(max_abs, block.max(axis=0), out=max_abs)
+        scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+
+        data = np.empty(embeddings.shape, dtype=np.int8)
+        for start in range(0, len(embeddings), block_size):
+            block = np.asarray(embeddings[start:start + block_size], dtype=np.float32) / scale
+            data[start:start + len(block)] = np.clip(np.rint(block), -127, 127)
+        return cls(dtype, data, scale)
+
+    def extended(self, new_embeddings: np.ndarray) -> 'QuantizedEmbeddings':
+        """Append rows quantized with the current scale; int8 values outside it are clipped."""
+        if self.dtype == 'float16':
+            tail = np.asarray(new_embeddings, dtype=np.float16)
+        else:
+            tail = np.clip(np.rint(np.asarray(new_embeddings, dtype=np.float32) / self.scale), -127, 127).astype(np.int8)
+        return QuantizedEmbeddings(self.dtype, np.concatenate([self.data, tail]), self.scale)
+
+    def scores(self, queries: np.ndarray, block_size=16_384) -> np.ndarray:
+        """Approximate similarities of every row against one query (d,) or a batch (m, d).
+
+        Returns shape (n,) for a single query and (n, m) for a batch.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.scale is not None:
+            queries = queries * self.scale
+        scores = np.empty((len(self.data),) + queries.shape[:-1], dtype=np.float32)
+        # NumPy has no BLAS kernel for float16/int8, so upcast cache-sized blocks.
+        for start in range(0, len(self.data), block_size):
+            block = self.data[start:start + block_size].astype(np.float32)
+            scores[start:start + len(block)] = block @ queries.T
+        return scores
+
+    def save(self, index_dir: str, rows_id: str):
+        """Persist next to the index, keyed on the rows it was built from."""
+        arrays = {'data': self.data} if self.scale is None else {'data': self.data, 'scale': self.scale}
+        save_derived(derived_path(index_dir, self.dtype, rows_id, len(self)), arrays)
+
+    @classmethod
+    def load(cls, index_dir: str, dtype: str, rows_id: str, n_rows: int):
+        """Map the compact matrix built from exactly these rows, or return None if there is none."""
+        names = ('data',) if dtype == 'float16' else ('data', 'scale')
+        arrays = load_derived(derived_path(index_dir, dtype, rows_id, n_rows), names, mmap_mode='r')
+        if arrays is None or len(arrays['data']) != n_rows:
+            return None
+        scale = np.array(arrays['scale']) if dtype == 'int8' else None
+        return cls(dtype, arrays['data'], scale)
+
+
+def rerank(embeddings: np.ndarray, candidates: np.ndarray, query: np.ndarray, top_k: int):
+    """Re-score candidate rows at full precision and keep the best `top_k`."""
+    candidates = np.sort(candidates)
+    scores = np.asarray(embeddings[candidates], dtype=np.float32) @ query
+    best = top_k_indices(scores, top_k)
+    return candidates[best], scores[best]
@@ -1,4 +1,5 @@
 # ai_services/roadmap_service.py
+import asyncio
 import json
 import re
 import logging
@@ -29,12 +30,7 @@ class RoadmapService:
     ) -> Roadmap:
         """Generates and saves a learning roadmap based on user input."""
         # 1. Validate and enhance the query
-        goal = request.goal
-        is_valid, reason, _ = self.validator.is_valid_learning_query(goal)
-        if not is_valid:
-            raise ValueError(f"Invalid learning goal: {reason}")
-
-        enhanced_goal = self.validator.enhance_query(goal)
+        enhanced_goal = self._enhanced_goal(request)
 
         # 2. Get context and build prompt
         context_chunks = self.vector_store.query_chunks(enhanced_goal, top_k=3)
@@ -50,6 +46,27 @@ class RoadmapService:
         
         return new_roadmap
 
+    async def agenerate_learning_roadmap(
+        self, db: Session, user_id: str, request: RoadmapRequest
+    ) -> Roadmap:
+        """Async variant for route handlers: retrieval and the LLM call run off the event loop."""
+        enhanced_goal = self._enhanced_goal(request)
+        context_chunks = await self.vector_store.aquery_chunks(enhanced_goal, top_k=3)
+        prompt = self.prompts.get_roadmap_prompt(enhanced_goal, context_chunks)
+
+        llm_response = await asyncio.to_thread(self.llm_client.call_llm, prompt)
+        if not llm_response:
+            raise ConnectionError("Failed to get a response from the LLM.")
+
+        return self._parse_and_save_roadmap(db, user_id, request, llm_response)
+
+    def _enhanced_goal(self, request: RoadmapRequest) -> str:
+        goal = request.goal
+        is_valid, reason, _ = self.validator.is_valid_learning_query(goal)
+        if not is_valid:
+            raise ValueError(f"Invalid learning goal: {reason}")
+        return self.validator.enhance_query(goal)
+
     def _parse_and_save_roadmap(
         self, db: Session, user_id: str, request: RoadmapRequest, llm_response: str
     ) -> Roadmap:
@@ -0,0 +1,69 @@
+# ai_services/utils/bounded_executor.py
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when a BoundedExecutor already holds `max_queue` pending tasks."""
+
+
+class BoundedExecutor:
+    """Thread pool for CPU-bound work awaited from async handlers, with a cap on pending tasks.
+
+    Tasks beyond `max_queue` (running plus waiting) are rejected with ExecutorBusyError
+    instead of queueing without bound, so an overloaded worker sheds load quickly.
+    """
+
+    def __init__(self, max_workers=4, max_queue=64, name='bounded-executor'):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` on the pool and await its result."""
+        with self._lock:
+            if self.pending >= self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusyError(f"{self.pending} tasks pending; try again shortly.")
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, functools.partial(self._call, fn, *args, **kwargs))
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    def _call(self, fn, *args, **kwargs):
+        with self._lock:
+            self.running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    def stats(self) -> dict:
+        """Queue depth (tasks waiting for a thread), running tasks and lifetime counters."""
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'queue_depth': self.pending - self.running,
+                'running': self.running,
+                'peak_pending': self.peak_pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+            }
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,140 @@
+# ai_services/utils/text_chunker.py
+import re
+from collections.abc import Iterable, Iterator
+from itertools import islice
+
+# A sentence ends at ., ! or ? followed by whitespace, or at a blank line.
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def iter_sentences(pieces: Iterable[str], max_length=None) -> Iterator[str]:
+    """Yield sentences from text that arrives in pieces (e.g. a file's lines), buffering only the unfinished one.
+
+    With `max_length`, sentences longer than it are split between words as `_split_long`
+    does. An unfinished sentence is split as soon as it is known to be too long, so text
+    without sentence boundaries streams in bounded memory, and the pieces are the same
+    however the text is fed.
+    """
+    if isinstance(pieces, str):
+        pieces = [pieces]
+    buffer = ''
+    # Once the sentence at the start of `buffer` is known to be too long if it grows past
+    # this many characters (0 once it was partly split off); None while it may still fit.
+    long_after = None
+    for piece in pieces:
+        # Earlier text was already scanned; only a boundary in its trailing whitespace can still grow.
+        resume = len(buffer.rstrip())
+        buffer += piece
+        start = 0
+        for match in _SENTENCE_END.finditer(buffer, resume):
+            # A boundary at the very end may still grow (e.g. into a blank line); wait for more text.
+            if match.end() == len(buffer):
+                break
+            yield from _sentence_units(buffer[start:match.start()].strip(), max_length, long_after)
+            long_after = None
+            start = match.end()
+        buffer = buffer[start:]
+        if max_length and len(buffer) > max_length:
+            units, buffer, long_after = _cut_unfinished(buffer, max_length, long_after)
+            yield from units
+    yield from _sentence_units(buffer.strip(), max_length, long_after)
+
+
+def _sentence_units(sentence: str, max_length, long_after) -> Iterator[str]:
+    if not sentence:
+        return
+    if max_length and (len(sentence) > max_length or (long_after is not None and len(sentence) > long_after)):
+        yield from _split_long(sentence, max_length)
+    else:
+        yield sentence
+
+
+def _cut_unfinished(text: str, max_length: int, long_after) -> tuple[list[str], str, int]:
+    """Shrink the buffer of an unfinished sentence that outgrew `max_length`.
+
+    Returns the leading pieces that are final whatever text follows, the text to keep
+    buffering and the updated `long_after` of `iter_sentences`. Greedy word packing
+    never revisits a piece once a later word has opened the next one, so only the last
+    piece and the last (possibly growing) word stay buffered. A sentence that is short
+    but for its trailing whitespace keeps one whitespace character standing for it.
+    """
+    # Leading whitespace is never part of a sentence.
+    text = text.lstrip()
+    stripped = text.rstrip()
+    # Trailing whitespace only matters for the sentence boundary it may become.
+    newlines = text.count('\n', len(stripped))
+    trailing = '' if len(stripped) == len(text) else '\n\n' if newlines > 1 else '\n' if newlines else ' '
+    if len(stripped) <= max_length:
+        if len(text) <= max_length:
+            return [], text, long_after
+        # Any further word makes the sentence longer than max_length.
+        return [], stripped + trailing, len(stripped) if long_after is None else long_after
+    i = len(stripped)
+    while i and not stripped[i - 1].isspace():
+        i -= 1
+    units, last = list(_split_long(stripped[:i], max_length)), stripped[i:]
+    piece = units.pop() if units else ''
+    if len(last) > max_length:
+        # As in _split_long: a word longer than a piece closes the open piece and is cut.
+        if piece:
+            units.append(piece)
+            piece = ''
+        while len(last) > max_length:
+            units.append(last[:max_length])
+            last = last[max_length:]
+    return units, f"{piece} {last}{trailing}" if piece else last + trailing, 0
+
+
+def _split_long(sentence: str, chunk_size: int) -> Iterator[str]:
+    """Break a sentence longer than `chunk_size` at word boundaries; a single longer word is cut."""
+    piece = ''
+    for word in sentence.split():
+        while len(word) > chunk_size:
+            if piece:
+                yield piece
+                piece = ''
+            yield word[:chunk_size]
+            word = word[chunk_size:]
+        if piece and len(piece) + 1 + len(word) > chunk_size:
+            yield piece
+            piece = word
+        else:
+            piece = f"{piece} {word}" if piece else word
+    if piece:
+        yield piece
+
+
+def iter_chunks(text: str | Iterable[str], chunk_size=512, overlap=50) -> Iterator[str]:
+    """Yield sentence-aligned chunks of at most `chunk_size` characters.
+
+    Each chunk starts with the trailing sentences of the previous one that fit in
+    `overlap` characters. Sentences longer than a chunk are split between words.
+    `text` may be a string or any iterable of strings, so a file object can be
+    chunked without reading it whole.
+    """
+    if overlap >= chunk_size:
+        raise ValueError(f"overlap ({overlap}) must be smaller than chunk_size ({chunk_size}).")
+    window, length = [], 0
+    for unit in iter_sentences(text, chunk_size):
+        if window and length + 1 + len(unit) > chunk_size:
+            yield ' '.join(window)
+            # Carry the trailing sentences that fit in the overlap into the next window.
+            carried, carried_length = [], 0
+            for previous in reversed(window):
+                grown = carried_length + len(previous) + 1
+                if grown > overlap or grown + len(unit) > chunk_size:
+                    break
+                carried.insert(0, previous)
+                carried_length += len(previous) + 1
+            window, length = carried, max(carried_length - 1, 0)
+        length += len(unit) + (1 if window else 0)
+        window.append(unit)
+    if window:
+        yield ' '.join(window)
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """Group an iterable into lists of `size` items; the last one may be shorter."""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
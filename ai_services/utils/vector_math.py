@@ -0,0 +1,30 @@
+# ai_services/utils/vector_math.py
+import numpy as np
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Scale vectors to unit length so a dot product equals cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def is_normalized(vectors, sample_size=64, atol=1e-3) -> bool:
+    """Check a sample of rows for unit length."""
+    if len(vectors) == 0:
+        return True
+    sample = np.asarray(vectors[:sample_size], dtype=np.float32)
+    return bool(np.allclose(np.linalg.norm(sample, axis=-1), 1.0, atol=atol))
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without sorting every score."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
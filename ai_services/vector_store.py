@@ -1,60 +1,414 @@
 # ai_services/vector_store.py
 import os
 import pickle
+import threading
+import uuid
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 from logging import getLogger
 import json
 import glob
+from concurrent.futures.process import BrokenProcessPool
+
+from .ann_index import IVFIndex
+from .bm25 import ranked_rows, reciprocal_rank_fusion
+from .dedup import MinHashDeduplicator, merge_duplicate_columns
+from .embedding_cache import EmbeddingCache
+from .encoders import ENCODER_BACKENDS, MicroBatchEncoder, create_encoder, create_ingest_pool, encode_parallel
+from .index_snapshot import IndexSnapshot
+from .index_storage import ChunkTexts, GrowableIndexBuffer, IndexChangedError, SegmentStore, merge_columns
+from .prebuilt_artifacts import (
+    PREBUILT_MODEL_NAME, KNOWN_DIMENSIONS, artifacts_present, artifact_fingerprint, load_prebuilt_artifacts
+)
+from .quantization import STORAGE_DTYPES, QuantizedEmbeddings, rerank
+from .utils.bounded_executor import BoundedExecutor
+from .utils.lru_cache import LRUCache
+from .utils.text_chunker import batched, iter_chunks
+from .utils.vector_math import normalize_rows, is_normalized, top_k_indices
 
 logger = getLogger(__name__)
 
+INDEX_TYPES = ('flat', 'ivf')
+# Metadata columns every chunk is expected to carry (None when not applicable).
+METADATA_COLUMNS = ('source', 'roadmap', 'user_id', 'document_id')
+
 class VectorStore:
-    """Manages text embeddings for context retrieval."""
+    """Manages text embeddings for context retrieval.
 
-    def __init__(self, model_name='all-MiniLM-L6-v2', index_file='data/vector_index.pkl'):
-        self.model = SentenceTransformer(model_name)
-        self.index_file = index_file
-        self.chunks = []
-        self.embeddings = []
+    `index_type='ivf'` enables an approximate IVF-flat index once the corpus has at
+    least `exact_search_below` chunks; smaller corpora are always scanned exactly.
+    `storage_dtype='float16'` or `'int8'` scans a compact copy of the matrix first and
+    re-ranks the best `top_k * rerank_factor` rows against the float32 file.
+    Query embeddings and top-k results are kept in LRU caches; results are keyed on
+    `index_version`, which changes whenever the index does.
+    The encoder loads lazily; queries that arrive before it is ready wait up to
+    `encoder_wait_timeout` seconds and then fall back to keyword matching.
+    Each add is persisted as a new segment; once there are more than `max_segments`
+    they are merged by a background compaction. Chunk embeddings are also kept in a
+    content-addressed cache, so re-indexing unchanged chunks skips the encoder.
+    With `ingest_workers > 1`, large adds are encoded across a process pool in
+    batches of `ingest_batch_size`. The pool starts with the first such add and is
+    kept until `shutdown_ingest_pool()`.
+    Chunks carry column-wise metadata (see METADATA_COLUMNS). Queries accept a
+    `filter` such as `{'source': 'roadmap', 'roadmap': ['git-github', 'docker']}`
+    and only score the rows listed in the matching precomputed partitions.
+    With `hybrid=True` (per store or per query), the dense ranking is fused with a
+    BM25 ranking by reciprocal-rank fusion so exact tool names are not missed.
+    The index is served from an immutable IndexSnapshot. Writers build a new snapshot
+    and swap the reference, so queries never see half-updated state. Every write bumps
+    the manifest generation, and `start_reload_watcher()` reloads the index in each
+    worker when another process publishes a new generation.
+    Near-duplicate chunks in one add (or prebuilt import) are collapsed by MinHash/LSH
+    when `dedup_threshold` is set. The kept chunk records the metadata of every copy:
+    a column whose values differ becomes a list, and filters match any list item.
+    Async handlers should use `aquery_chunks` / `aadd_chunks`, which run on a bounded
+    executor of `executor_workers` threads and reject work beyond `executor_queue_size`.
+    Query encodes from concurrent requests are coalesced into batches of up to
+    `encode_batch_size` texts, waiting at most `encode_max_wait_ms` for company.
+    `delete_chunks` tombstones rows, which queries mask out; once more than
+    `purge_dead_ratio` of the rows are dead, a background job rewrites the index without them.
+    With several workers, set `shared_dir` (e.g. /dev/shm) so a multi-segment index is merged
+    once into a shared file that every worker maps, instead of being copied into each one.
+    `encoder_backend='hashing'` swaps the SentenceTransformer for a HashingEncoder that needs
+    no model weights. Its vectors are not comparable with the model's, so keep its index apart.
+    """
+
+    def __init__(self, model_name='all-MiniLM-L6-v2', index_dir='data/vector_index',
+                 legacy_index_file='data/vector_index.pkl', min_similarity=None,
+                 index_type='flat', nprobe=8, n_lists=None, exact_search_below=10_000,
+                 storage_dtype='float32', rerank_factor=4, query_cache_size=1024, result_cache_size=1024,
+                 encoder_wait_timeout=10.0, max_segments=8,
+                 embedding_cache_file='data/embedding_cache.sqlite3', ingest_workers=1, ingest_batch_size=256,
+                 hybrid=False, hybrid_depth=10, rrf_k=60, reload_interval=5.0,
+                 dedup_threshold=0.8, executor_workers=4, executor_queue_size=64,
+                 encode_batch_size=32, encode_max_wait_ms=5.0, purge_dead_ratio=0.2, shared_dir=None,
+                 encoder_backend='sentence-transformers'):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index_type '{index_type}'. Expected one of {INDEX_TYPES}.")
+        if storage_dtype not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown storage_dtype '{storage_dtype}'. Expected one of {STORAGE_DTYPES}.")
+        if encoder_backend not in ENCODER_BACKENDS:
+            raise ValueError(f"Unknown encoder_backend '{encoder_backend}'. Expected one of {ENCODER_BACKENDS}.")
+        self.encoder_backend = encoder_backend
+        self.model = create_encoder(encoder_backend, model_name)
+        self.query_encoder = MicroBatchEncoder(self.model, encode_batch_size, encode_max_wait_ms)
+        self.encoder_wait_timeout = encoder_wait_timeout
+        self.ingest_workers = ingest_workers
+        self.ingest_batch_size = ingest_batch_size
+        self._ingest_pool = None
+        self._ingest_pool_lock = threading.Lock()
+        self.embedding_cache = (EmbeddingCache(embedding_cache_file, self.model.model_name)
+                                if embedding_cache_file else None)
+        self.index_dir = index_dir
+        self.storage = SegmentStore(index_dir, shared_dir)
+        self.max_segments = max_segments
+        self._compaction_thread = None
+        self._compaction_lock = threading.Lock()
+        self.purge_dead_ratio = purge_dead_ratio
+        self._purge_thread = None
+        self.legacy_index_file = legacy_index_file
+        self.min_similarity = min_similarity
+        self.index_type = index_type
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.exact_search_below = exact_search_below
+        self.storage_dtype = storage_dtype
+        self.rerank_factor = rerank_factor
+        self.query_cache = LRUCache(query_cache_size)
+        self.result_cache = LRUCache(result_cache_size)
+        self.hybrid = hybrid
+        self.hybrid_depth = hybrid_depth
+        self.rrf_k = rrf_k
+        self.reload_interval = reload_interval
+        self.deduplicator = MinHashDeduplicator(dedup_threshold) if dedup_threshold is not None else None
+        self.executor = BoundedExecutor(executor_workers, executor_queue_size, name='vector-store')
+        self._reload_thread = None
+        self._reload_stop = threading.Event()
+        # Serializes writers; readers only ever read `_snapshot` once and never lock.
+        self._write_lock = threading.RLock()
+        self._snapshot = IndexSnapshot.empty()
+        # Append buffer behind the snapshot built by the last add; stale once any other write publishes.
+        self._buffer = None
+        self._buffer_version = None
         self.load_index()
 
-    def add_chunks(self, new_chunks: list[str]):
-        """Add new chunks to the index and save."""
+    @property
+    def snapshot(self) -> IndexSnapshot:
+        return self._snapshot
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self._snapshot.embeddings
+
+    @property
+    def chunks(self) -> ChunkTexts:
+        return self._snapshot.chunks
+
+    @property
+    def metadata(self) -> dict:
+        return self._snapshot.metadata
+
+    @property
+    def ann_index(self):
+        return self._snapshot.ann_index
+
+    @property
+    def quantized(self):
+        return self._snapshot.quantized
+
+    @property
+    def index_version(self) -> int:
+        return self._snapshot.version
+
+    def _publish(self, embeddings: np.ndarray, chunks: ChunkTexts, metadata: dict, generation=None,
+                 ann_index=None, quantized=None, deleted=None):
+        """Swap in a new snapshot. Queries already running finish on the one they started with."""
+        self._snapshot = IndexSnapshot(embeddings, chunks, metadata, self._snapshot.version + 1, generation,
+                                       ann_index, quantized, deleted)
+        # Results are keyed on the version, so this only frees memory held by stale entries.
+        self.result_cache.clear()
+
+    def add_chunks(self, new_chunks: list[str], metadata=None):
+        """Add new chunks to the index and persist them as a new segment.
+
+        `metadata` is either one dict applied to every chunk or a list with one dict per chunk.
+        """
         if not new_chunks:
             logger.warning("No new chunks to add.")
             return
 
+        new_columns = _metadata_columns(metadata, len(new_chunks))
+        keep, new_columns = self._deduplicate(new_chunks, new_columns)
+        new_chunks = [new_chunks[i] for i in keep]
         logger.info(f"Adding {len(new_chunks)} new chunks to the index.")
-        new_embeddings = self.model.encode(new_chunks, show_progress_bar=True)
-        
-        if self.embeddings is None or len(self.embeddings) == 0:
-            self.embeddings = new_embeddings
-        else:
-            # Ensure embeddings are numpy arrays before stacking
-            if not isinstance(self.embeddings, np.ndarray):
-                self.embeddings = np.array(self.embeddings)
-            self.embeddings = np.vstack([self.embeddings, new_embeddings])
-            
-        self.chunks.extend(new_chunks)
+        new_embeddings = self.encode_chunks(new_chunks)
         logger.info("Generated embeddings for new chunks.")
-        self.save_index()
 
-    def build_index_from_text(self, text: str, chunk_size=512, overlap=50):
-        """Create vector index from a single large text."""
-        if not text:
-            logger.warning("Text for indexing is empty. Index not built.")
-            return
+        with self._write_lock:
+            current = self._snapshot
+            if self._buffer is None or self._buffer_version != current.version:
+                # First add after a load: stack a buffer with spare capacity behind the mapped rows.
+                self._buffer = GrowableIndexBuffer(current.embeddings, current.chunks)
+            embeddings, chunks = self._buffer.append(new_embeddings, new_chunks)
+            metadata = merge_columns([(current.metadata, len(current)), (new_columns, len(new_chunks))])
+            ann_index = self._sync_ann_index(current.ann_index, embeddings)
+            quantized = self._sync_quantized(current.quantized, embeddings)
+            deleted = current.deleted
+            if deleted is not None:
+                deleted = np.concatenate([deleted, np.zeros(len(new_chunks), dtype=bool)])
 
-        text_chunks = []
-        start = 0
-        while start < len(text):
-            end = start + chunk_size
-            text_chunks.append(text[start:end])
-            start += chunk_size - overlap
-        
-        self.add_chunks(text_chunks)
+            generation = self._append_segment(new_embeddings, new_chunks, new_columns)
+            self._publish(embeddings, chunks, metadata, self._claim_generation(current, generation),
+                          ann_index, quantized, deleted)
+            self._buffer_version = self._snapshot.version
+
+    @staticmethod
+    def _claim_generation(current: IndexSnapshot, generation):
+        """The generation a new snapshot may record after writing `generation` on top of `current`.
+
+        Only claim it if nothing else wrote in between; otherwise keep the old one so the
+        reload watcher picks up the other writer's changes.
+        """
+        if generation is None or generation != (current.generation or 0) + 1:
+            return current.generation
+        return generation
+
+    def delete_chunks(self, filter: dict) -> int:
+        """Tombstone the chunks matching `filter` (as in queries).
+
+        Queries stop returning them immediately. Returns how many chunks were newly deleted.
+        A merged duplicate that other sources still own, such as roadmap ['docker',
+        'kubernetes'] under {'roadmap': 'docker'}, only loses the matched values and stays;
+        that needs a rewrite of the index rather than a tombstone.
+        """
+        if not filter:
+            raise ValueError("delete_chunks needs a non-empty filter.")
+        with self._write_lock:
+            current = self._snapshot
+            targets, detached = _release_owners(current.metadata, _filter_rows(current, filter), filter)
+            if detached:
+                return self._delete_and_detach(filter)
+            deleted = np.zeros(len(current), dtype=bool) if current.deleted is None else current.deleted.copy()
+            if len(targets) == 0:
+                return 0
+            deleted[targets] = True
+
+            try:
+                generation = self.storage.write_tombstones(deleted)
+            except (IOError, ValueError) as e:
+                logger.error(f"Error saving tombstones to {self.index_dir}: {e}")
+                generation = None
+            self._publish(current.embeddings, current.chunks, current.metadata,
+                          self._claim_generation(current, generation), current.ann_index, current.quantized, deleted)
+            if self._buffer_version == current.version:
+                # Same rows as before, so the append buffer still backs this snapshot.
+                self._buffer_version = self._snapshot.version
+        logger.info(f"Deleted {len(targets)} chunks ({self._snapshot.n_deleted} of {len(current)} rows are dead).")
+        if self._snapshot.n_deleted > self.purge_dead_ratio * len(current):
+            self.start_purge()
+        return len(targets)
+
+    def _delete_and_detach(self, filter: dict, attempts=3) -> int:
+        """Rewrite the index without the rows `filter` leaves ownerless, and without the matched
+        values in the merged rows it does not. Retries on top of other processes' writes."""
+        for attempt in range(attempts):
+            current = self._snapshot
+            ownerless, detached = _release_owners(current.metadata, _filter_rows(current, filter), filter)
+            metadata = {name: list(values) for name, values in current.metadata.items()}
+            for column, values in detached.items():
+                for row, value in values.items():
+                    metadata[column][row] = value
+            live = current.live_rows()
+            keep = np.setdiff1d(np.arange(len(current)) if live is None else live, ownerless, assume_unique=True)
+            try:
+                self._rewrite_rows(current, keep, metadata)
+            except IndexChangedError as e:
+                if attempt == attempts - 1:
+                    raise
+                logger.info(f"{e} Reloading before deleting.")
+                self.load_index()
+                continue
+            self.load_index()
+            n_detached = len({row for values in detached.values() for row in values})
+            logger.info(f"Deleted {len(ownerless)} chunks; {n_detached} merged chunks keep their other owners.")
+            return len(ownerless)
+
+    def _rewrite_rows(self, current: IndexSnapshot, rows: np.ndarray, metadata=None):
+        """Persist `rows` of `current` as the whole index, with `metadata` in place of its columns.
+
+        Raises IndexChangedError if another process changed the index since `current` was loaded.
+        """
+        embeddings = np.ascontiguousarray(current.embeddings[rows], dtype=np.float32)
+        chunks = ChunkTexts.from_list([current.chunks[i] for i in rows])
+        metadata = metadata if metadata is not None else current.metadata
+        columns = {name: [values[i] for i in rows] for name, values in metadata.items()}
+        self.storage.rewrite(embeddings, chunks, columns, expected_generation=current.generation or 0)
+
+    def start_purge(self):
+        """Rewrite the index without its deleted rows in a background thread, unless one is running."""
+        with self._compaction_lock:
+            if self._purge_thread is not None and self._purge_thread.is_alive():
+                return
+            self._purge_thread = threading.Thread(target=self._purge_deleted, name="index-purge", daemon=True)
+            self._purge_thread.start()
+
+    def _purge_deleted(self):
+        """Drop tombstoned rows from memory and disk. Adds wait for it; queries do not.
+
+        If another process changed the index since this one loaded it, reload (picking up
+        its rows and the persisted tombstones) and purge that instead.
+        """
+        with self._write_lock:
+            for _ in range(2):
+                current = self._snapshot
+                live = current.live_rows()
+                if live is None:
+                    return
+                logger.info(f"Purging {current.n_deleted} deleted chunks from {self.index_dir}.")
+                try:
+                    self._rewrite_rows(current, live)
+                except IndexChangedError as e:
+                    logger.info(f"{e} Reloading before purging.")
+                    if not self.load_index():
+                        return
+                    continue
+                except IOError as e:
+                    logger.error(f"Error saving purged index to {self.index_dir}: {e}")
+                    return
+                self.load_index()
+                return
+
+    def _deduplicate(self, chunks, columns: dict) -> tuple[np.ndarray, dict]:
+        """Row ids to keep and their merged columns after collapsing near-duplicate chunks."""
+        if self.deduplicator is None or len(chunks) < 2:
+            return np.arange(len(chunks)), columns
+        keep, columns = merge_duplicate_columns(columns, self.deduplicator.clusters(chunks))
+        if len(keep) < len(chunks):
+            logger.info(f"Collapsed {len(chunks) - len(keep)} near-duplicate chunks into {len(keep)}.")
+        return keep, columns
+
+    def encode_chunks(self, chunks: list[str]) -> np.ndarray:
+        """Unit-length chunk embeddings, sending only embedding-cache misses to the model."""
+        # Normalize once here so queries only need a dot product.
+        if self.embedding_cache is None:
+            return normalize_rows(self._encode_texts(chunks))
+
+        embeddings = self.embedding_cache.get_many(chunks)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        logger.info(f"Embedding cache: {len(chunks) - len(missing)} hits, {len(missing)} misses.")
+        if missing:
+            missing_chunks = [chunks[i] for i in missing]
+            encoded = normalize_rows(self._encode_texts(missing_chunks))
+            self.embedding_cache.put_many(missing_chunks, encoded)
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding
+        return np.stack(embeddings)
+
+    def _encode_texts(self, texts: list[str]) -> np.ndarray:
+        """Encode in-process, or across the bulk-ingest pool when there is more than one batch."""
+        if (self.encoder_backend == 'sentence-transformers' and self.ingest_workers > 1
+                and len(texts) > self.ingest_batch_size):
+            with self._ingest_pool_lock:
+                if self._ingest_pool is None:
+                    self._ingest_pool = create_ingest_pool(self.model.model_name, self.ingest_workers)
+                pool = self._ingest_pool
+            try:
+                return encode_parallel(pool, texts, self.ingest_batch_size)
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); the next add starts a fresh pool.
+                self.shutdown_ingest_pool(wait=False)
+                raise
+        return self.model.encode(texts, show_progress_bar=True)
+
+    def shutdown_ingest_pool(self, wait=True):
+        """Stop the bulk-ingest worker processes, if any were started."""
+        with self._ingest_pool_lock:
+            pool, self._ingest_pool = self._ingest_pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def _append_segment(self, new_embeddings: np.ndarray, new_chunks: list[str], new_columns: dict):
+        """Write only the new rows to disk, compacting in the background once segments pile up.
+
+        Returns the manifest generation written, or None if the segment could not be saved.
+        """
+        try:
+            segment_count, generation = self.storage.append(new_embeddings, ChunkTexts.from_list(new_chunks),
+                                                            new_columns)
+            logger.info(f"Index segment saved to {self.index_dir} ({segment_count} segments)")
+        except IOError as e:
+            logger.error(f"Error saving index segment to {self.index_dir}: {e}")
+            return None
+        if segment_count > self.max_segments:
+            self.start_compaction()
+        return generation
+
+    def start_compaction(self):
+        """Merge the on-disk segments in a background thread unless a compaction is running."""
+        with self._compaction_lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            self._compaction_thread = threading.Thread(target=self._compact, name="index-compaction", daemon=True)
+            self._compaction_thread.start()
+
+    def _compact(self):
+        try:
+            self.storage.compact()
+        except (IOError, ValueError) as e:
+            logger.error(f"Index compaction in {self.index_dir} failed: {e}")
+
+    def build_index_from_text(self, text, chunk_size=512, overlap=50, metadata=None, batch_size=4096):
+        """Index a large text as sentence-aligned chunks of at most `chunk_size` characters.
+
+        `text` is a string or an iterable of strings such as an open file. Chunks are
+        streamed and added `batch_size` at a time, so only one batch is held in memory.
+        `metadata` is a single dict applied to every chunk.
+        """
+        added = 0
+        for batch in batched(iter_chunks(text, chunk_size, overlap), batch_size):
+            self.add_chunks(batch, metadata)
+            added += len(batch)
+        if not added:
+            logger.warning("Text for indexing is empty. Index not built.")
 
     def load_and_index_roadmaps(self, roadmaps_dir: str):
         """Load JSON roadmaps, create text chunks, and add them to the index."""
@@ -64,8 +418,9 @@ class VectorStore:
             return
 
         logger.info(f"Found {len(json_files)} JSON roadmap files to index.")
-        new_chunks = []
+        new_chunks, new_metadata = [], []
         for file_path in json_files:
+            slug = os.path.splitext(os.path.basename(file_path))[0]
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
@@ -75,79 +430,550 @@ class VectorStore:
                         if title and description:
                             chunk = f"Topic: {title}\n{description}"
                             new_chunks.append(chunk)
+                            new_metadata.append({'source': 'roadmap', 'roadmap': slug, 'title': title})
             except (json.JSONDecodeError, IOError) as e:
                 logger.error(f"Failed to read or parse {os.path.basename(file_path)}: {e}")
         
-        self.add_chunks(new_chunks)
+        self.add_chunks(new_chunks, new_metadata)
+
+    def save_index(self, expected_generation=None, **manifest_fields):
+        """Rewrite the current snapshot as a single segment, with its ANN and compact matrices.
 
-    def save_index(self):
-        """Save chunks and embeddings to a pickle file."""
-        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        With `expected_generation`, raises IndexChangedError if another writer moved the index past it.
+        """
+        snapshot = self._snapshot
+        rows_id = uuid.uuid4().hex[:12]
         try:
-            with open(self.index_file, 'wb') as f:
-                pickle.dump({'chunks': self.chunks, 'embeddings': self.embeddings}, f)
-            logger.info(f"Index saved successfully to {self.index_file}")
+            self.storage.rewrite(snapshot.embeddings, snapshot.chunks, snapshot.metadata, expected_generation,
+                                 rows_id=rows_id, **manifest_fields)
+            self._save_derived(snapshot, rows_id)
+            logger.info(f"Index saved successfully to {self.index_dir}")
+            return True
         except IOError as e:
-            logger.error(f"Error saving index to {self.index_file}: {e}")
+            logger.error(f"Error saving index to {self.index_dir}: {e}")
+            return False
 
-    def load_index(self):
-        """Load index from a pickle file if it exists."""
-        if os.path.exists(self.index_file):
+    def _save_derived(self, snapshot: IndexSnapshot, rows_id: str):
+        if snapshot.ann_index is not None and len(snapshot.ann_index) == len(snapshot):
+            snapshot.ann_index.save(self.index_dir, rows_id)
+        if snapshot.quantized is not None and len(snapshot.quantized) == len(snapshot):
+            snapshot.quantized.save(self.index_dir, rows_id)
+
+    def load_index(self) -> bool:
+        """Map the index segments and publish them as the current snapshot, migrating a legacy pickle index if needed.
+
+        Returns False if nothing was loaded, in which case the previous snapshot keeps serving.
+        """
+        with self._write_lock:
+            if self.storage.exists():
+                try:
+                    generation, rows_id, embeddings, chunks, metadata = self.storage.load_versioned()
+                    logger.info(f"Index mapped successfully from {self.index_dir} "
+                                f"({len(chunks)} chunks, generation {generation})")
+                    if not is_normalized(embeddings):
+                        logger.info("Index embeddings are not unit length. Normalizing them once.")
+                        self._publish(normalize_rows(embeddings), chunks, metadata, generation)
+                        try:
+                            return self.load_index() if self.save_index(generation) else True
+                        except IndexChangedError:
+                            return self.load_index()
+                    ann_index = self._load_ann_index(embeddings, rows_id)
+                    quantized = self._load_quantized(embeddings, rows_id)
+                    deleted = self.storage.load_tombstones(len(chunks))
+                except (IOError, ValueError) as e:
+                    logger.error(f"Error loading index from {self.index_dir}: {e}")
+                    return False
+                self._publish(embeddings, chunks, metadata, generation, ann_index, quantized, deleted)
+                return True
+            if self.legacy_index_file and os.path.exists(self.legacy_index_file):
+                return self._migrate_legacy_index()
+            logger.warning(f"Index directory {self.index_dir} not found. Starting with an empty index.")
+            return False
+
+    def reload_if_changed(self) -> bool:
+        """Load and publish the on-disk index if its manifest generation differs from the served snapshot."""
+        try:
+            generation = self.storage.manifest_value('generation')
+        except (IOError, ValueError) as e:
+            logger.error(f"Could not read the index manifest in {self.index_dir}: {e}")
+            return False
+        if generation is None or generation == self._snapshot.generation:
+            return False
+        logger.info(f"Index generation changed ({self._snapshot.generation} -> {generation}). Reloading.")
+        return self.load_index()
+
+    def request_reload(self) -> int:
+        """Bump the on-disk generation so every worker reloads the index; this one reloads right away."""
+        generation = self.storage.publish()
+        self.reload_if_changed()
+        return generation
+
+    def start_reload_watcher(self, interval=None):
+        """Poll the manifest in a background thread and hot-reload when its generation changes."""
+        interval = self.reload_interval if interval is None else interval
+        with self._write_lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return
+            self._reload_stop.clear()
+            self._reload_thread = threading.Thread(target=self._watch_generation, args=(interval,),
+                                                   name="index-reload", daemon=True)
+            self._reload_thread.start()
+
+    def stop_reload_watcher(self):
+        self._reload_stop.set()
+
+    def _watch_generation(self, interval: float):
+        while not self._reload_stop.wait(interval):
             try:
-                with open(self.index_file, 'rb') as f:
-                    data = pickle.load(f)
-                    self.chunks = data.get('chunks', [])
-                    self.embeddings = data.get('embeddings', [])
-                logger.info(f"Index loaded successfully from {self.index_file}")
-            except (IOError, pickle.PickleError) as e:
-                logger.error(f"Error loading index from {self.index_file}: {e}")
-                self.chunks, self.embeddings = [], []
-        else:
-            logger.warning(f"Index file {self.index_file} not found. Starting with an empty index.")
+                self.reload_if_changed()
+            except Exception as e:
+                logger.error(f"Index hot reload failed: {e}")
+
+    def _new_ann_index(self) -> IVFIndex:
+        return IVFIndex(n_lists=self.n_lists, nprobe=self.nprobe)
+
+    def _load_ann_index(self, embeddings: np.ndarray, rows_id: str):
+        """Load the ANN index persisted for these rows, or build and persist it."""
+        if self.index_type != 'ivf' or len(embeddings) < self.exact_search_below:
+            return None
+        ann_index = self._new_ann_index()
+        if not ann_index.load(self.index_dir, rows_id, len(embeddings)):
+            logger.info(f"No IVF index saved for these {len(embeddings)} rows. Building one.")
+            ann_index = self._sync_ann_index(None, embeddings)
+            ann_index.save(self.index_dir, rows_id)
+        return ann_index
+
+    def _sync_ann_index(self, ann_index, embeddings: np.ndarray):
+        """An ANN index covering every row of `embeddings`, extending `ann_index` where possible."""
+        if self.index_type != 'ivf' or len(embeddings) < self.exact_search_below:
+            return None
+        if ann_index is not None and ann_index.is_trained:
+            indexed, total = len(ann_index), len(embeddings)
+            if indexed == total:
+                return ann_index
+            # Bucket new rows under the existing centroids until the corpus has doubled
+            # since training, then retrain so the lists stay balanced.
+            if 0 < indexed < total <= 2 * ann_index.trained_size:
+                return ann_index.extended(embeddings[indexed:])
+        ann_index = self._new_ann_index()
+        ann_index.build(embeddings)
+        return ann_index
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counters for the query-embedding and result caches."""
+        return {'query_embeddings': self.query_cache.stats(), 'results': self.result_cache.stats()}
+
+    def _load_quantized(self, embeddings: np.ndarray, rows_id: str):
+        """Map the compact matrix persisted for these rows, or build and persist it."""
+        if self.storage_dtype == 'float32':
+            return None
+        quantized = QuantizedEmbeddings.load(self.index_dir, self.storage_dtype, rows_id, len(embeddings))
+        if quantized is None:
+            quantized = self._sync_quantized(None, embeddings)
+            quantized.save(self.index_dir, rows_id)
+        return quantized
+
+    def _sync_quantized(self, quantized, embeddings: np.ndarray):
+        """A compact matrix covering every row of `embeddings`, extending `quantized` where possible."""
+        if self.storage_dtype == 'float32':
+            return None
+        if quantized is not None and len(quantized) == len(embeddings):
+            return quantized
+        if quantized is not None and 0 < len(quantized) < len(embeddings):
+            return quantized.extended(embeddings[len(quantized):])
+        return QuantizedEmbeddings.from_embeddings(embeddings, self.storage_dtype)
 
-    def query_chunks(self, query: str, top_k=3) -> list[str]:
+    def _migrate_legacy_index(self) -> bool:
+        """Convert the old whole-file pickle index into the memory-mapped layout."""
+        try:
+            with open(self.legacy_index_file, 'rb') as f:
+                data = pickle.load(f)
+        except (IOError, pickle.PickleError) as e:
+            logger.error(f"Error loading legacy index from {self.legacy_index_file}: {e}")
+            return False
+
+        chunks = list(data.get('chunks', []))
+        embeddings = normalize_rows(data.get('embeddings', []))
+        if not chunks or len(embeddings) != len(chunks):
+            logger.warning(f"Legacy index {self.legacy_index_file} is empty or inconsistent. Ignoring it.")
+            return False
+
+        logger.info(f"Migrating legacy index {self.legacy_index_file} to {self.index_dir}")
+        self._publish(embeddings, ChunkTexts.from_list(chunks), {})
+        try:
+            return self.load_index() if self.save_index(expected_generation=0) else True
+        except IndexChangedError:
+            # Another worker migrated (or wrote) the index first; serve what it wrote.
+            return self.load_index()
+
+    def import_prebuilt(self, data_dir='data', artifacts_model_name=PREBUILT_MODEL_NAME) -> bool:
+        """Adopt the shipped chunks.pkl/embeddings.pkl/metadata.pkl instead of re-encoding the corpus.
+
+        Returns True if the index now holds the artifacts, either freshly imported or from
+        an earlier import of the same files. A non-empty index built some other way is left alone.
+        """
+        if not artifacts_present(data_dir):
+            return False
+        if artifacts_model_name != self.model.model_name:
+            logger.warning(f"Prebuilt artifacts were encoded with '{artifacts_model_name}', "
+                           f"but the store uses '{self.model.model_name}'. Not importing them.")
+            return False
+
+        fingerprint = artifact_fingerprint(data_dir, artifacts_model_name)
+        # The import below may only replace the index this decision was made on.
+        expected_generation = self.storage.manifest_value('generation', 0)
+        imported = self.storage.manifest_value('prebuilt_fingerprint')
+        # Decide from what is on disk: a worker whose last load failed must not rewrite the index.
+        indexed = bool(self.storage.segments)
+        if imported == fingerprint and indexed:
+            logger.info("Index already holds the current prebuilt artifacts. Skipping import.")
+            return True
+        if imported is None and indexed:
+            logger.info("Index was not built from prebuilt artifacts. Skipping import.")
+            return False
+
+        dimension = KNOWN_DIMENSIONS.get(self.model.model_name)
+        if dimension is None:
+            dimension = self.model.encode(['dimension probe']).shape[-1]
+        try:
+            chunks, embeddings, metadata = load_prebuilt_artifacts(data_dir, dimension)
+        except (IOError, ValueError, ImportError, pickle.PickleError) as e:
+            logger.error(f"Prebuilt artifacts in {data_dir} are not usable: {e}")
+            return False
+        columns = _metadata_columns(metadata, len(chunks))
+
+        keep, columns = self._deduplicate(chunks, columns)
+        chunks = [chunks[i] for i in keep]
+        logger.info(f"Importing {len(chunks)} prebuilt chunks from {data_dir}.")
+        embeddings = normalize_rows(embeddings[keep])
+        if self.embedding_cache is not None:
+            self.embedding_cache.put_many(chunks, embeddings)
+        with self._write_lock:
+            self._publish(embeddings, ChunkTexts.from_list(chunks), columns)
+            try:
+                if not self.save_index(expected_generation, prebuilt_fingerprint=fingerprint):
+                    return False
+            except IndexChangedError as e:
+                logger.info(f"{e} Not importing over it.")
+                self.load_index()
+                return self.storage.manifest_value('prebuilt_fingerprint') == fingerprint
+            self.load_index()
+        return True
+
+    def query_chunks(self, query: str, top_k=3, min_similarity=None, filter=None, hybrid=None) -> list[str]:
         """Find the most relevant text chunks for a given query."""
-        if not self.chunks or self.embeddings is None or len(self.embeddings) == 0:
+        return self.query_chunks_batch([query], top_k, min_similarity, filter, hybrid)[0]
+
+    def query_chunks_batch(self, queries: list[str], top_k=3, min_similarity=None, filter=None,
+                           hybrid=None) -> list[list[str]]:
+        """Find the most relevant chunks for several queries with one encode and one matrix product."""
+        if not queries:
+            return []
+        # Everything below reads this one snapshot, even if a writer swaps in a new one meanwhile.
+        snapshot = self._snapshot
+        if len(snapshot) == 0 or len(snapshot.embeddings) == 0:
             logger.warning("Index is empty. Cannot perform a query.")
+            return [[] for _ in queries]
+
+        if not self.model.wait(self.encoder_wait_timeout):
+            logger.warning("Encoder is not ready. Falling back to keyword matching.")
+            rows = _filter_rows(snapshot, filter) if filter else snapshot.live_rows()
+            return [self._keyword_search(snapshot, query, top_k, rows) for query in queries]
+
+        threshold = self.min_similarity if min_similarity is None else min_similarity
+        hybrid = self.hybrid if hybrid is None else hybrid
+        keys = [_normalize_query(query) for query in queries]
+        cache_suffix = (top_k, threshold, _filter_key(filter), hybrid, snapshot.version)
+        results = [self.result_cache.get((key, *cache_suffix)) for key in keys]
+        pending = [i for i, result in enumerate(results) if result is None]
+
+        if pending:
+            rows = _filter_rows(snapshot, filter) if filter else None
+            pending_keys = [keys[i] for i in pending]
+            query_embeddings = self._encode_queries(pending_keys)
+            if hybrid:
+                matches = self._hybrid_search(snapshot, pending_keys, query_embeddings, top_k, rows)
+            else:
+                matches = self._search(snapshot, query_embeddings, top_k, rows)
+            for i, (top_indices, similarities) in zip(pending, matches):
+                if snapshot.deleted is not None:
+                    live = ~snapshot.deleted[top_indices]
+                    top_indices, similarities = top_indices[live], similarities[live]
+                if threshold is not None:
+                    top_indices = top_indices[similarities >= threshold]
+                results[i] = tuple(snapshot.chunks[j] for j in top_indices)
+                self.result_cache.put((keys[i], *cache_suffix), results[i])
+
+        return [list(result) for result in results]
+
+    async def aquery_chunks(self, query: str, top_k=3, min_similarity=None, filter=None, hybrid=None) -> list[str]:
+        """`query_chunks` on the bounded executor, so encoding and scoring stay off the event loop."""
+        return await self.executor.run(self.query_chunks, query, top_k, min_similarity, filter, hybrid)
+
+    async def aquery_chunks_batch(self, queries: list[str], top_k=3, min_similarity=None, filter=None,
+                                  hybrid=None) -> list[list[str]]:
+        return await self.executor.run(self.query_chunks_batch, queries, top_k, min_similarity, filter, hybrid)
+
+    async def aadd_chunks(self, new_chunks: list[str], metadata=None):
+        """`add_chunks` on the bounded executor."""
+        return await self.executor.run(self.add_chunks, new_chunks, metadata)
+
+    def wait_for_encoder(self, timeout=None) -> bool:
+        """Wait up to `timeout` (default `encoder_wait_timeout`) seconds for the encoder; True if usable."""
+        return self.model.wait(self.encoder_wait_timeout if timeout is None else timeout)
+
+    def index_stats(self) -> dict:
+        snapshot = self._snapshot
+        return {'chunks': len(snapshot), 'deleted': snapshot.n_deleted, 'index_version': snapshot.version,
+                'generation': snapshot.generation}
+
+    def executor_stats(self) -> dict:
+        """Queue depth and counters of the executor behind the async API."""
+        return self.executor.stats()
+
+    def encoder_stats(self) -> dict:
+        """Micro-batching settings and batch-size/wait metrics of the query encoder."""
+        return self.query_encoder.stats()
+
+    def _keyword_search(self, snapshot: IndexSnapshot, query: str, top_k: int, rows=None) -> list[str]:
+        """Rank chunks by BM25 alone. Used while the encoder loads."""
+        scores = snapshot.bm25().scores([query])
+        if len(scores) == 0:
             return []
+        return [snapshot.chunks[i] for i in ranked_rows(scores[:, 0], top_k, rows)]
 
-        query_embedding = self.model.encode([query])
-        similarities = cosine_similarity(query_embedding, self.embeddings).flatten()
-        
-        num_chunks = len(self.chunks)
-        k = min(top_k, num_chunks)
-        if k == 0: return []
-            
-        top_indices = np.argsort(similarities)[-k:][::-1]
-        
-        return [self.chunks[i] for i in top_indices]
+    def _hybrid_search(self, snapshot: IndexSnapshot, queries: list[str], query_embeddings: np.ndarray, top_k: int,
+                       rows=None):
+        """Fuse the dense and BM25 rankings of each query by reciprocal-rank fusion.
+
+        Similarities returned are the dense cosine scores of the fused rows, so
+        `min_similarity` means the same thing in both modes.
+        """
+        depth = top_k * self.hybrid_depth
+        dense = self._search(snapshot, query_embeddings, depth, rows)
+        sparse_scores = snapshot.bm25().scores(queries)
+        results = []
+        sparse_subset = rows if rows is not None else snapshot.live_rows()
+        for j, (dense_rows, _) in enumerate(dense):
+            sparse_rows = ranked_rows(sparse_scores[:, j], depth, sparse_subset) if len(sparse_scores) else []
+            fused = reciprocal_rank_fusion([dense_rows, sparse_rows], self.rrf_k)[:top_k]
+            similarities = np.asarray(snapshot.embeddings[fused], dtype=np.float32) @ query_embeddings[j]
+            results.append((fused, similarities))
+        return results
+
+    def start_warmup(self):
+        """Start loading the encoder in the background."""
+        self.model.start_warmup()
+
+    def encode_queries(self, queries: list[str]) -> np.ndarray:
+        """Unit-length query embeddings, served from the query cache where possible."""
+        return self._encode_queries([_normalize_query(query) for query in queries])
+
+    def _encode_queries(self, keys: list[str]) -> np.ndarray:
+        """Unit-length embeddings for normalized queries, encoding only cache misses."""
+        cached = {key: self.query_cache.get(key) for key in dict.fromkeys(keys)}
+        missing = [key for key, embedding in cached.items() if embedding is None]
+        if missing:
+            for key, embedding in zip(missing, normalize_rows(self.query_encoder.encode(missing))):
+                cached[key] = embedding
+                self.query_cache.put(key, embedding)
+        return np.stack([cached[key] for key in keys])
+
+    def _search(self, snapshot: IndexSnapshot, query_embeddings: np.ndarray, top_k: int,
+                rows=None) -> list[tuple[np.ndarray, np.ndarray]]:
+        """Return (row indices, similarities) of the best matches for each query, best first.
+
+        With `rows`, only those rows are scored, exactly. Deleted rows rank last.
+        """
+        embeddings, ann_index, quantized = snapshot.embeddings, snapshot.ann_index, snapshot.quantized
+        if rows is not None:
+            similarities = np.asarray(embeddings[rows], dtype=np.float32) @ query_embeddings.T
+            results = []
+            for j in range(len(query_embeddings)):
+                column = similarities[:, j]
+                best = top_k_indices(column, top_k)
+                results.append((rows[best], column[best]))
+            return results
+
+        if ann_index is not None and ann_index.is_trained and len(ann_index) == len(embeddings):
+            return [ann_index.search(embeddings, q, top_k, deleted=snapshot.deleted) for q in query_embeddings]
+
+        if quantized is not None and len(quantized) == len(embeddings):
+            approximate = quantized.scores(query_embeddings)
+            if snapshot.deleted is not None:
+                approximate[snapshot.deleted] = -np.inf
+            results = []
+            for j, q in enumerate(query_embeddings):
+                column = approximate[:, j]
+                candidates = top_k_indices(column, top_k * self.rerank_factor)
+                # Deleted rows must not reach the re-ranking, which would score them like live ones.
+                candidates = candidates[np.isfinite(column[candidates])]
+                results.append(rerank(embeddings, candidates, q, top_k))
+            return results
+
+        # Rows are unit length, so one matrix product gives every cosine similarity.
+        similarities = embeddings @ query_embeddings.T
+        if snapshot.deleted is not None:
+            similarities[snapshot.deleted] = -np.inf
+        results = []
+        for j in range(len(query_embeddings)):
+            column = similarities[:, j]
+            top_indices = top_k_indices(column, top_k)
+            results.append((top_indices, column[top_indices]))
+        return results
+
+def _filter_rows(snapshot: IndexSnapshot, filter: dict) -> np.ndarray:
+    """Sorted row ids matching every column of `filter`; a list value matches any of its items."""
+    rows = None
+    for column, wanted in filter.items():
+        values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+        partition = snapshot.partition(column)
+        matches = [partition[v] for v in map(_metadata_value, values) if v in partition]
+        column_rows = np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.int64)
+        rows = column_rows if rows is None else np.intersect1d(rows, column_rows, assume_unique=True)
+    if snapshot.deleted is not None:
+        rows = rows[~snapshot.deleted[rows]]
+    return rows
+
+def _release_owners(metadata: dict, rows: np.ndarray, filter: dict) -> tuple[np.ndarray, dict]:
+    """Split the rows matching `filter` into rows it leaves without an owner and merged rows that keep some.
+
+    A merged duplicate lists every value it was indexed under. It keeps an owner if some
+    filtered column still has values once the matched ones are removed. Returns the
+    ownerless rows and, per column, the remaining value of each row that keeps one.
+    """
+    wanted = {
+        column: set(_metadata_value(list(values) if isinstance(values, (list, tuple, set)) else [values]))
+        for column, values in filter.items()
+    }
+    ownerless, detached = [], {}
+    for row in rows:
+        remaining = {}
+        for column, values in wanted.items():
+            column_values = metadata.get(column)
+            value = column_values[row] if column_values else None
+            left = [item for item in value if item not in values] if isinstance(value, list) else []
+            if left:
+                remaining[column] = left[0] if len(left) == 1 else left
+        if not remaining:
+            ownerless.append(row)
+        for column, value in remaining.items():
+            detached.setdefault(column, {})[int(row)] = value
+    return np.asarray(ownerless, dtype=np.int64), detached
+
+def _metadata_value(value):
+    """Store metadata as JSON scalars or lists of them; UUIDs and other objects become strings."""
+    if isinstance(value, (list, tuple)):
+        return [_metadata_value(item) for item in value]
+    return value if value is None or isinstance(value, (str, int, float, bool)) else str(value)
+
+def _metadata_columns(metadata, n_rows: int) -> dict:
+    """Turn one dict for all rows, or one dict per row, into columns including METADATA_COLUMNS."""
+    if metadata is None:
+        metadata = {}
+    if isinstance(metadata, dict):
+        metadata = [metadata] * n_rows
+    if len(metadata) != n_rows:
+        raise ValueError(f"Got metadata for {len(metadata)} chunks but {n_rows} chunks to add.")
+    names = dict.fromkeys([*METADATA_COLUMNS, *(key for entry in metadata for key in entry)])
+    return {name: [_metadata_value(entry.get(name)) for entry in metadata] for name in names}
+
+def _filter_key(filter) -> tuple:
+    """Hashable form of a query filter for the result cache.
+
+    Values are compared as stored, so `5` and `'5'`, which match different rows, get different keys.
+    """
+    if not filter:
+        return ()
+    return tuple(sorted(
+        (column, tuple(sorted(repr(_metadata_value(v)) for v in wanted))
+         if isinstance(wanted, (list, tuple, set)) else repr(_metadata_value(wanted)))
+        for column, wanted in filter.items()
+    ))
+
+def _normalize_query(query: str) -> str:
+    """Cache key for a query. The default MiniLM model is uncased, so case is folded too."""
+    return ' '.join(query.split()).lower()
+
+def _create_vector_store():
+    """The in-process store, or a client of the embedding server when VECTOR_STORE_SOCKET is set."""
+    socket_path = os.getenv('VECTOR_STORE_SOCKET')
+    if socket_path:
+        from .embedding_server import RemoteVectorStore
+        logger.info(f"Using the embedding server at {socket_path}.")
+        return RemoteVectorStore(socket_path, encoder_backend=os.getenv('EMBEDDING_BACKEND', 'sentence-transformers'))
+    return create_local_vector_store()
+
+def create_local_vector_store() -> VectorStore:
+    """The in-process store configured by EMBEDDING_BACKEND and VECTOR_INDEX_SHARED_DIR."""
+    backend = os.getenv('EMBEDDING_BACKEND', 'sentence-transformers')
+    shared_dir = os.getenv('VECTOR_INDEX_SHARED_DIR')
+    if backend == 'sentence-transformers':
+        return VectorStore(shared_dir=shared_dir)
+    # Another backend embeds into another space, so it gets its own index and nothing is migrated into it.
+    logger.info(f"Using the '{backend}' encoder backend.")
+    return VectorStore(index_dir=f'data/vector_index-{backend}', legacy_index_file=None, embedding_cache_file=None,
+                       encoder_backend=backend, shared_dir=shared_dir)
 
 # Global instance
-vector_store = VectorStore()
+vector_store = _create_vector_store()
 
-def initialize_learning_context():
-    """Read context files and build the vector store index."""
-    # Check if the index is already populated to avoid re-indexing on every startup
-    if vector_store.chunks:
-        logger.info("Vector store already populated. Skipping initialization.")
+def _index_learning_context(store: VectorStore, learning_context_file='learning_context.txt'):
+    """Chunk and index the generic learning context text file."""
+    if not os.path.exists(learning_context_file):
+        logger.warning(f"Context file not found: {learning_context_file}")
         return
+    try:
+        with open(learning_context_file, 'r', encoding='utf-8') as f:
+            store.build_index_from_text(f, metadata={'source': 'learning_context'})
+    except Exception as e:
+        logger.error(f"Failed to initialize from {learning_context_file}: {e}")
 
-    logger.info("Initializing learning context for RAG...")
-    # 1. Initialize from the generic learning context text file
-    learning_context_file = 'learning_context.txt'
-    if os.path.exists(learning_context_file):
-        try:
-            with open(learning_context_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            vector_store.build_index_from_text(content)
-        except Exception as e:
-            logger.error(f"Failed to initialize from {learning_context_file}: {e}")
-    else:
-        logger.warning(f"Context file not found: {learning_context_file}")
+def initialize_learning_context(store=None, background=False):
+    """Read context files and build the vector store index.
+
+    The prebuilt import needs no encoder and runs right away. With `background`, the
+    chunks that have to be encoded are indexed in a daemon thread, so startup does not
+    wait for the model to load.
+    """
+    store = store or vector_store
+    if not isinstance(store, VectorStore):
+        logger.info("The embedding server owns the index and initializes it. Skipping initialization.")
+        return
 
-    # 2. Initialize from the JSON roadmaps data
-    roadmaps_dir = 'data/roadmaps'
-    if os.path.isdir(roadmaps_dir):
-        vector_store.load_and_index_roadmaps(roadmaps_dir)
+    # Adopt the prebuilt artifacts shipped in data/ when they are usable. This is a
+    # no-op once they are imported, and re-imports them if they change.
+    prebuilt = store.import_prebuilt('data')
+    if background:
+        threading.Thread(target=_index_missing_sources, args=(store, prebuilt),
+                         name="learning-context-index", daemon=True).start()
     else:
-        logger.warning(f"Roadmaps directory not found: {roadmaps_dir}")
+        _index_missing_sources(store, prebuilt)
+
+def _index_missing_sources(store: VectorStore, prebuilt: bool):
+    """Index whatever the prebuilt artifacts do not cover, unless some worker already has."""
+    # Workers start together; one indexes while the others wait, then see its rows on disk.
+    with store.storage.exclusive('initialize'):
+        store.reload_if_changed()
+        if prebuilt:
+            # The artifacts only cover the roadmaps, so the learning context is added on top, once.
+            if len(store.chunks) and 'learning_context' not in store.snapshot.partition('source'):
+                _index_learning_context(store)
+            return
+
+        # Check if the index is already populated to avoid re-indexing on every startup
+        if store.chunks:
+            logger.info("Vector store already populated. Skipping initialization.")
+            return
+
+        logger.info("Initializing learning context for RAG...")
+
+        # 1. Initialize from the generic learning context text file
+        _index_learning_context(store)
+
+        # 2. Initialize from the JSON roadmaps data
+        roadmaps_dir = 'data/roadmaps'
+        if os.path.isdir(roadmaps_dir):
+            store.load_and_index_roadmaps(roadmaps_dir)
+        else:
+            logger.warning(f"Roadmaps directory not found: {roadmaps_dir}")
@@ -0,0 +1,62 @@
+# benchmarks/quantization_recall.py
+"""Recall@k lost by quantized first-pass scoring, on synthetic clustered embeddings.
+
+Run from the repository root:
+    python -m benchmarks.quantization_recall --rows 100000 --dim 384
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from ai_services.quantization import QuantizedEmbeddings, rerank
+from ai_services.utils.vector_math import normalize_rows, top_k_indices
+
+
+def synthetic_embeddings(n_rows: int, dim: int, n_clusters: int, rng) -> np.ndarray:
+    """Unit vectors scattered around random topic centers, like sentence embeddings."""
+    centers = normalize_rows(rng.standard_normal((n_clusters, dim)))
+    labels = rng.integers(0, n_clusters, n_rows)
+    return normalize_rows(centers[labels] + 0.35 * rng.standard_normal((n_rows, dim)).astype(np.float32))
+
+
+def run(n_rows=50_000, dim=384, n_queries=200, top_k=10, rerank_factors=(1, 2, 4, 8), seed=0) -> dict:
+    rng = np.random.default_rng(seed)
+    embeddings = synthetic_embeddings(n_rows, dim, max(1, n_rows // 500), rng)
+    queries = normalize_rows(embeddings[rng.integers(0, n_rows, n_queries)]
+                             + 0.2 * rng.standard_normal((n_queries, dim)).astype(np.float32))
+    started = time.perf_counter()
+    exact = [set(top_k_indices(embeddings @ q, top_k)) for q in queries]
+    exact_ms = 1000 * (time.perf_counter() - started) / n_queries
+
+    results = {'rows': n_rows, 'dim': dim, 'queries': n_queries, 'top_k': top_k,
+               'modes': [{'dtype': 'float32', 'rerank_factor': None, 'recall_at_k': 1.0,
+                          'mean_query_ms': exact_ms, 'compact_bytes': int(embeddings.nbytes)}]}
+    for dtype in ('float16', 'int8'):
+        quantized = QuantizedEmbeddings.from_embeddings(embeddings, dtype)
+        for factor in rerank_factors:
+            hits, started = 0, time.perf_counter()
+            for q, truth in zip(queries, exact):
+                candidates = top_k_indices(quantized.scores(q), top_k * factor)
+                found, _ = rerank(embeddings, candidates, q, top_k)
+                hits += len(truth.intersection(found))
+            elapsed = time.perf_counter() - started
+            results['modes'].append({
+                'dtype': dtype,
+                'rerank_factor': factor,
+                'recall_at_k': hits / (n_queries * top_k),
+                'mean_query_ms': 1000 * elapsed / n_queries,
+                'compact_bytes': quantized.nbytes,
+            })
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.dim, args.queries, args.top_k), indent=2))
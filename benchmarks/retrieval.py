@@ -0,0 +1,189 @@
+# benchmarks/retrieval.py
+"""Query latency, ingest throughput, memory and recall@k of VectorStore per search mode.
+
+Chunks are embedded by the hashing encoder backend, so no model is downloaded and
+runs are comparable between machines and releases. Run from the repository root:
+    python -m benchmarks.retrieval --rows 1000 10000 100000 --output retrieval.json
+    python -m benchmarks.retrieval --roadmaps data/roadmaps
+
+Recall@k is measured against an exact float32 scan of the same embeddings (a row tied
+with the k-th best counts as found), so for the hybrid mode it is the overlap with the
+dense ranking rather than a quality loss.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from ai_services.vector_store import VectorStore
+from ai_services.utils.vector_math import top_k_indices
+
+# Store settings of every mode; IVF is forced on for small corpora too.
+MODES = {
+    'flat': {},
+    'float16': {'storage_dtype': 'float16'},
+    'int8': {'storage_dtype': 'int8'},
+    'ivf': {'index_type': 'ivf', 'exact_search_below': 0},
+    'hybrid': {'hybrid': True},
+    'filtered': {},
+}
+
+
+def synthetic_corpus(n_rows: int, rng, n_topics=None, words_per_chunk=12):
+    """Chunks of topic words plus some shared filler, tagged with their topic as `roadmap`."""
+    n_topics = n_topics or max(1, n_rows // 200)
+    topics = rng.integers(0, n_topics, n_rows)
+    topic_words = rng.integers(0, 40, (n_rows, words_per_chunk - 2))
+    filler = rng.integers(0, 500, (n_rows, 2))
+    chunks = [
+        f"doc{i} " + ' '.join(f"t{topic}w{w}" for w in words) + ' ' + ' '.join(f"common{w}" for w in shared)
+        for i, (topic, words, shared) in enumerate(zip(topics, topic_words, filler))
+    ]
+    metadata = [{'source': 'synthetic', 'roadmap': f"topic-{topic}"} for topic in topics]
+    return chunks, metadata
+
+
+def roadmap_corpus(roadmaps_dir: str):
+    """Chunks and metadata exactly as `VectorStore.load_and_index_roadmaps` builds them."""
+    chunks, metadata = [], []
+    for name in sorted(os.listdir(roadmaps_dir)):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(roadmaps_dir, name), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for value in data.values():
+            title, description = value.get('title', ''), value.get('description', '')
+            if title and description:
+                chunks.append(f"Topic: {title}\n{description}")
+                metadata.append({'source': 'roadmap', 'roadmap': name[:-5], 'title': title})
+    return chunks, metadata
+
+
+def sample_queries(chunks, metadata, n_queries: int, rng, n_words=4):
+    """Short word windows cut from random chunks, with the roadmap of the chunk they came from."""
+    queries, roadmaps = [], []
+    for row in rng.integers(0, len(chunks), n_queries):
+        words = chunks[row].split()[1:] or chunks[row].split()
+        start = rng.integers(0, max(1, len(words) - n_words + 1))
+        queries.append(' '.join(words[start:start + n_words]))
+        roadmaps.append(metadata[row]['roadmap'])
+    return queries, roadmaps
+
+
+def _rss_bytes() -> int:
+    """Current resident set size, or the peak where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _open_store(index_dir: str, **settings) -> VectorStore:
+    return VectorStore(index_dir=index_dir, legacy_index_file=None, embedding_cache_file=None,
+                       encoder_backend='hashing', result_cache_size=0, encode_max_wait_ms=0, **settings)
+
+
+def run_corpus(chunks, metadata, n_queries=200, top_k=10, batch_size=10_000, modes=tuple(MODES),
+               dedup_threshold=0.8, seed=0) -> dict:
+    rng = np.random.default_rng(seed)
+    index_dir = tempfile.mkdtemp(prefix='retrieval-bench-')
+    try:
+        rss_before = _rss_bytes()
+        store = _open_store(index_dir, dedup_threshold=dedup_threshold)
+        started = time.perf_counter()
+        for start in range(0, len(chunks), batch_size):
+            store.add_chunks(chunks[start:start + batch_size], metadata[start:start + batch_size])
+        ingest_seconds = time.perf_counter() - started
+        # Ground truth comes from the stored rows, which near-duplicate collapsing may have merged.
+        row_of = {text: row for row, text in enumerate(store.chunks)}
+        embeddings = np.asarray(store.embeddings)
+        partitions = store.snapshot.partition('roadmap')
+        queries, roadmaps = sample_queries(chunks, metadata, n_queries, rng)
+        query_embeddings = store.encode_queries(queries)
+        encoder_name = store.model.model_name
+        del store
+
+        results = {
+            'encoder': encoder_name, 'rows': len(chunks), 'indexed_rows': len(embeddings),
+            'dim': embeddings.shape[1], 'queries': n_queries, 'top_k': top_k,
+            'ingest': {'seconds': ingest_seconds, 'rows_per_second': len(chunks) / ingest_seconds,
+                       'rss_bytes': _rss_bytes(), 'rss_growth_bytes': _rss_bytes() - rss_before},
+            'modes': [],
+        }
+        for mode in modes:
+            rss_before = _rss_bytes()
+            started = time.perf_counter()
+            store = _open_store(index_dir, **MODES[mode])
+            load_seconds = time.perf_counter() - started
+
+            latencies, hits = [], 0
+            for query, roadmap, q in zip(queries, roadmaps, query_embeddings):
+                query_filter = {'roadmap': roadmap} if mode == 'filtered' else None
+                started = time.perf_counter()
+                found = store.query_chunks(query, top_k, filter=query_filter)
+                latencies.append(time.perf_counter() - started)
+                rows = partitions[roadmap] if query_filter else np.arange(len(embeddings))
+                exact = embeddings[rows] @ q
+                kth_best = exact[top_k_indices(exact, top_k)[-1]]
+                # Bag-of-words vectors tie often; any row scoring as well as the k-th best counts as a hit.
+                found_scores = embeddings[[row_of[text] for text in found]] @ q
+                hits += int(np.sum(found_scores >= kth_best - 1e-6))
+
+            latencies_ms = 1000 * np.asarray(latencies)
+            results['modes'].append({
+                'mode': mode,
+                'load_seconds': load_seconds,
+                'p50_ms': float(np.percentile(latencies_ms, 50)),
+                'p99_ms': float(np.percentile(latencies_ms, 99)),
+                'mean_ms': float(latencies_ms.mean()),
+                'recall_at_k': hits / (n_queries * top_k),
+                'rss_bytes': _rss_bytes(),
+                'rss_growth_bytes': _rss_bytes() - rss_before,
+            })
+            del store
+        return results
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+
+def run(sizes=(1_000, 10_000, 100_000), roadmaps_dir=None, n_queries=200, top_k=10, batch_size=10_000,
+        modes=tuple(MODES), dedup_threshold=0.8, seed=0) -> dict:
+    if roadmaps_dir:
+        corpora = [roadmap_corpus(roadmaps_dir)]
+    else:
+        # Generated lazily, so only one corpus is held in memory at a time.
+        corpora = (synthetic_corpus(n_rows, np.random.default_rng(seed)) for n_rows in sizes)
+    runs = [run_corpus(chunks, metadata, n_queries, top_k, batch_size, modes, dedup_threshold, seed)
+            for chunks, metadata in corpora]
+    return {
+        'corpus': roadmaps_dir or 'synthetic',
+        'dedup_threshold': dedup_threshold,
+        'runs': runs,
+        'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--roadmaps', help="replay the roadmap JSON files in this directory instead")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=10_000, help="chunks per add_chunks call")
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--no-dedup', action='store_true', help="skip near-duplicate collapsing on ingest")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    report = json.dumps(run(args.rows, args.roadmaps, args.queries, args.top_k, args.batch_size,
+                            args.modes, None if args.no_dedup else 0.8), indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
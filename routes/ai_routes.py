@@ -1,6 +1,7 @@
 # routes/ai_routes.py
 import os
-from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, BackgroundTasks
+import secrets
+from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, BackgroundTasks, Header
 from sqlalchemy.orm import Session
 import PyPDF2
 import docx
@@ -13,6 +14,8 @@ from models import User
 # AI Services and Pydantic Models
 from ai_services.document_analyser import DocumentAnalyzer
 from ai_services.roadmap_service import roadmap_service
+from ai_services.vector_store import vector_store
+from ai_services.utils.bounded_executor import ExecutorBusyError
 from ai_services.utils.input_validator import (
     ChatRequest,
     AnalyzeFileResponse,
@@ -77,7 +80,7 @@ async def analyze_file(
         analyzer = DocumentAnalyzer()
         # Create the file record in the DB immediately
         new_file = analyzer.add_document(
-            db, current_user.id, filename, content_type, text_content
+            db, current_user.id, filename, content_type, text_content, background_tasks
         )
 
         # Run the CPU/network-bound analysis in the background
@@ -99,12 +102,14 @@ async def chat_with_document(
     """Engage in a conversation with an analyzed document."""
     try:
         analyzer = DocumentAnalyzer()
-        chat_result = analyzer.chat_with_document(
+        chat_result = await analyzer.achat_with_document(
             db, current_user.id, request.document_id, request.question
         )
         return ChatResponse(**chat_result)
     except ValueError as ve:
         raise HTTPException(status_code=404, detail=str(ve))
+    except ExecutorBusyError as be:
+        raise HTTPException(status_code=503, detail=str(be))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat error: {e}")
 
@@ -154,19 +159,39 @@ async def get_learning_roadmap(
 ):
     """Generate and save a personalized learning roadmap."""
     try:
-        roadmap = roadmap_service.generate_learning_roadmap(
+        roadmap = await roadmap_service.agenerate_learning_roadmap(
             db, current_user.id, request
         )
         return roadmap
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
-    except ConnectionError as ce:
+    except (ConnectionError, ExecutorBusyError) as ce:
         raise HTTPException(status_code=503, detail=str(ce))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate roadmap: {e}")
 
+@router.post("/ai/admin/reload-index/", tags=["AI Services"])
+def reload_index(
+    x_admin_token: str = Header(None),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Make every worker hot-reload the retrieval index. Requires the INDEX_ADMIN_TOKEN header."""
+    admin_token = os.getenv('INDEX_ADMIN_TOKEN')
+    if not admin_token or not x_admin_token or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Index administration is not allowed.")
+    try:
+        generation = vector_store.request_reload()
+    except ValueError as ve:
+        raise HTTPException(status_code=409, detail=str(ve))
+    return {**vector_store.index_stats(), "generation": generation}
+
 @router.get("/ai/health/", status_code=200, tags=["AI Services"])
 async def health_check():
     """Check if the AI service and its dependencies are running."""
     # In a real app, you might check DB connection, LLM client, etc.
-    return {"status": "AI services are operational"}
+    return {
+        "status": "AI services are operational",
+        "retrieval_executor": vector_store.executor_stats(),
+        "query_encoder": vector_store.encoder_stats(),
+        "caches": vector_store.cache_stats(),
+    }